@@ -0,0 +1,13 @@
+from ttt.daemon import DEFAULT_SOCKET, AcquisitionDaemon
+
+GAIN = 50  # dB, until a client asks for another
+BIN_SIZE = 512
+SOCKET_PATH = DEFAULT_SOCKET
+
+
+if __name__ == "__main__":
+    daemon = AcquisitionDaemon(SOCKET_PATH, gain=GAIN, bin_size=BIN_SIZE)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,220 @@
+"""Throughput benchmark for the RTLSDR.take_exposure spectrum path.
+
+Sweeps sample size, bin size, sample rate, FFT precision and acquisition mode
+against the simulated dongle, so it runs on machines without an RTL-SDR.
+Every configuration runs in a fresh process so that peak RSS belongs to that
+configuration alone; it includes the worker processes of the workers-N modes.
+The rtlobs mode is the default acquisition path, the baseline for the others.
+Results go to a JSON file for comparing commits and
+hosts:
+
+    python benchmark_acquisition.py [output.json] [--realtime]
+
+Unpaced, the streaming and worker modes are usually limited by their reader
+thread and report dropped blocks; that is the reader outrunning processing,
+which real hardware cannot do.
+
+By default the simulated dongle delivers samples as fast as they are asked
+for, which measures how much faster than real time each mode can process.
+With --realtime reads are paced to the sample rate like real hardware, which
+makes the reported take_exposure overhead meaningful instead.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+
+import numpy as np
+
+from ttt.rtlsdr import RTLSDR
+from ttt.simulate import SimulatedSDR
+
+INTEGRATION_TIME = 2  # seconds of samples per exposure
+GAIN = 40  # dB
+
+SAMPLE_SIZES = [4096, 65536]
+BIN_SIZES = [512, 1024, 2048]
+SAMPLE_RATES = [2.048e6, 2.4e6]
+PRECISIONS = {"single": np.complex64, "double": np.complex128}
+MODES = {
+    "rtlobs": {"engine": "rtlobs"},  # the default every script uses, as baseline
+    "native": {"engine": "native"},
+    "streaming": {"streaming": True},
+    "workers-2": {"workers": 2},
+    f"workers-{os.cpu_count()}": {"workers": os.cpu_count()},
+}
+
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+
+def _proc_dirs() -> list[str]:
+    # This process and its children, which are the spectrum worker processes
+    # of the workers-N modes.
+    return ["/proc/self"] + [f"/proc/{p.pid}" for p in mp.active_children()]
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the kernel's peak RSS mark of this process and its children, so
+    what follows is measured on its own.
+    Returns:
+        bool: Whether the reset is supported here (Linux only).
+    """
+    try:
+        for proc in _proc_dirs():
+            with open(f"{proc}/clear_refs", "w") as f:
+                f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    Peak resident set size of this process plus that of each of its live
+    children, since reset_peak_rss if that worked.
+    Returns:
+        int: Bytes, or None where it cannot be measured.
+    """
+    try:
+        total = 0
+        for proc in _proc_dirs():
+            with open(f"{proc}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1]) * 1024
+        return total
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Without /proc only children that have exited are counted, and only the
+    # largest of them.
+    peak = sum(
+        resource.getrusage(who).ru_maxrss
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    )
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_config(config: dict, realtime: bool) -> dict:
+    """
+    Time one exposure for a configuration. Runs in its own process.
+    Args:
+        config (dict): sample_size, bin_size, sample_rate, precision and mode.
+        realtime (bool): Pace the simulated dongle to its sample rate.
+    Returns:
+        dict: The configuration with its measurements added.
+    """
+    device = partial(SimulatedSDR, realtime=realtime, seed=0)
+    with RTLSDR(
+        sample_size=config["sample_size"],
+        bin_size=config["bin_size"],
+        gain=GAIN,
+        sample_rate=config["sample_rate"],
+        integration_time=INTEGRATION_TIME,
+        fft_dtype=PRECISIONS[config["precision"]],
+        device=device,
+        **MODES[config["mode"]],
+    ) as rtl:
+        # Leave the simulator's one-off synthesis out of the RSS figure.
+        rss_reset = reset_peak_rss()
+        started = time.perf_counter()
+        freqs, powers, overhead_time = rtl.take_exposure()
+        elapsed = time.perf_counter() - started
+        dropped = rtl.dropped_blocks
+        peak_rss = peak_rss_bytes()
+
+    n_blocks = max(
+        1, round(INTEGRATION_TIME * config["sample_rate"] / config["sample_size"])
+    )
+    n_samples = n_blocks * config["sample_size"]
+    return {
+        **config,
+        "ok": powers is not None,
+        "seconds": elapsed,
+        "samples_per_second": n_samples / elapsed,
+        "realtime_factor": n_samples / config["sample_rate"] / elapsed,
+        "overhead_seconds": overhead_time.total_seconds(),
+        "dropped_blocks": dropped,
+        "peak_rss_bytes": peak_rss,
+        "peak_rss_exposure_only": rss_reset,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", nargs="?", default=DEFAULT_OUTPUT)
+    parser.add_argument("--realtime", action="store_true")
+    args = parser.parse_args()
+
+    configs = [
+        dict(
+            sample_size=sample_size,
+            bin_size=bin_size,
+            sample_rate=sample_rate,
+            precision=precision,
+            mode=mode,
+        )
+        for sample_size, bin_size, sample_rate, precision, mode in itertools.product(
+            SAMPLE_SIZES, BIN_SIZES, SAMPLE_RATES, PRECISIONS, MODES
+        )
+    ]
+
+    results = []
+    print(
+        f"{'samples':>7} {'bins':>5} {'MS/s':>5} {'prec':>6} {'mode':>10} "
+        f"{'MS/s done':>9} {'x realtime':>10} {'overhead':>9} {'RSS MB':>7}"
+    )
+    for config in configs:
+        # One process per configuration keeps each peak RSS separate.
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(run_config, config, args.realtime).result()
+        results.append(result)
+        rss = result["peak_rss_bytes"]
+        print(
+            f"{config['sample_size']:>7} {config['bin_size']:>5} "
+            f"{config['sample_rate'] / 1e6:>5.3g} {config['precision']:>6} "
+            f"{config['mode']:>10} {result['samples_per_second'] / 1e6:>9.2f} "
+            f"{result['realtime_factor']:>10.2f} "
+            f"{result['overhead_seconds']:>8.3f}s "
+            f"{rss / 2**20 if rss else float('nan'):>7.1f}"
+        )
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "commit": git_commit(),
+        "realtime": args.realtime,
+        "integration_time": INTEGRATION_TIME,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
@@ -0,0 +1,48 @@
+"""Compare pyrtlsdr's read_samples conversion with the LUT path in ttt.iq.
+
+Runs without a dongle: both paths are fed the same random bytes, standing in
+for what RtlSdr.read_bytes returns.
+"""
+
+import timeit
+
+import numpy as np
+
+from ttt.iq import bytes_to_iq
+
+SAMPLE_SIZES = [4096, 65536, 262144]
+REPEAT = 5
+
+
+def packed_bytes_to_iq(raw) -> np.ndarray:
+    """
+    pyrtlsdr 0.3.0's RtlSdr.packed_bytes_to_iq, which read_samples calls on
+    every block. Copied so the benchmark does not need librtlsdr installed.
+    """
+    data = np.ctypeslib.as_array(raw)
+    iq = data.astype(np.float64).view(np.complex128)
+    iq /= 127.5
+    iq -= 1 + 1j
+    return iq
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    print(f"{'samples':>8} {'read_samples':>14} {'LUT':>10} {'speedup':>8}")
+    for n in SAMPLE_SIZES:
+        raw = rng.integers(0, 256, 2 * n, dtype=np.uint8)
+        out = np.empty(n, dtype=np.complex64)
+
+        assert np.allclose(bytes_to_iq(raw, out), packed_bytes_to_iq(raw), atol=1e-6)
+
+        number = max(1, 2_000_000 // n)
+        legacy = min(
+            timeit.repeat(lambda: packed_bytes_to_iq(raw), number=number, repeat=REPEAT)
+        ) / number
+        lut = min(
+            timeit.repeat(lambda: bytes_to_iq(raw, out), number=number, repeat=REPEAT)
+        ) / number
+        print(
+            f"{n:>8} {legacy * 1e6:>11.1f} us {lut * 1e6:>7.1f} us "
+            f"{legacy / lut:>7.1f}x"
+        )
@@ -0,0 +1,60 @@
+"""Show that RTLSDR.long_exposure runs in constant memory.
+
+Integrates 1 s to 1 h of samples from the simulated dongle, unpaced, each in
+a fresh process, and prints the peak RSS of each integration:
+
+    python benchmark_long_exposure.py
+
+An hour at 2.048 MS/s is 7.4 billion samples, so the longest run takes a
+few minutes even unpaced.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmark_acquisition import peak_rss_bytes, reset_peak_rss
+from ttt.rtlsdr import RTLSDR
+from ttt.simulate import SimulatedSDR
+
+DURATIONS = [1, 10, 60, 600, 3600]  # seconds
+SAMPLE_SIZE = 65536
+BIN_SIZE = 1024
+CHECKPOINT_INTERVAL = 60  # seconds
+
+
+def run_duration(duration: float) -> tuple[float, int | None]:
+    """
+    Run one long exposure. Runs in its own process.
+    Args:
+        duration (float): Integration time in seconds.
+    Returns:
+        seconds: float Wall time taken.
+        peak_rss: int Peak RSS in bytes during the exposure.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = os.path.join(directory, "checkpoint.npz")
+        with RTLSDR(
+            sample_size=SAMPLE_SIZE,
+            bin_size=BIN_SIZE,
+            integration_time=duration,
+            engine="native",
+            device=SimulatedSDR,
+        ) as rtl:
+            reset_peak_rss()
+            started = time.perf_counter()
+            rtl.long_exposure(checkpoint, CHECKPOINT_INTERVAL)
+            return time.perf_counter() - started, peak_rss_bytes()
+
+
+if __name__ == "__main__":
+    results = []
+    for duration in DURATIONS:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(run_duration, duration).result())
+
+    print(f"{'integration':>12} {'wall':>9} {'peak RSS':>10}")
+    for duration, (seconds, rss) in zip(DURATIONS, results):
+        rss_text = f"{rss / 2**20:.1f} MB" if rss else "n/a"
+        print(f"{duration:>10} s {seconds:>7.1f} s {rss_text:>10}")
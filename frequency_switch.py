@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from matplotlib import pyplot as plt
+
+from ttt.mount_ascom import connect, slew_ra_dec, disconnect
+
+from ttt.rtlsdr import RTLSDR
+from ttt.plots import plot_spectrum
+from ttt.file_io import save_spectrum, file_path
+from ttt.utils import SpectrumType
+
+INTEGRATION_TIME = 180  # seconds, split evenly between the two phases
+GAIN = 50  # dB
+BIN_SIZE = 512
+
+SWITCH_OFFSET = 0.8  # MHz between the two center frequencies
+SWITCH_CADENCE = 0.25  # seconds in each phase before switching
+
+# Unlike galactic.py there is no OFF position: the reference spectrum comes
+# from the same pointing, tuned away from the line.
+TARGETS = [  # (Right Ascension in hours, Declination in degrees)
+    (20.5, 45),
+]
+
+if __name__ == "__main__":
+    telescope = connect("ASCOM.ES_PMC8.Telescope")
+
+    try:
+        with RTLSDR(
+            integration_time=INTEGRATION_TIME, gain=GAIN, bin_size=BIN_SIZE
+        ) as rtl:
+            for ra, dec in TARGETS:
+                print("Pointing the antenna at (RA: {}, Dec: {})".format(ra, dec))
+                slew_ra_dec(telescope, ra, dec)
+                time_stamp = datetime.now()
+                print("Taking Frequency-Switched Observation")
+                freqs, powers, overhead_time = rtl.take_fs_exposure(
+                    SWITCH_OFFSET, SWITCH_CADENCE
+                )
+                filename = file_path(
+                    SpectrumType.PROCESSED, time_stamp, GAIN, INTEGRATION_TIME
+                )
+                with rtl.stage("save"):
+                    save_spectrum(freqs, powers, filename, pointing=(ra, dec))
+                plot_spectrum(freqs, powers, f"Frequency-Switched RA {ra} Dec {dec}")
+    finally:
+        disconnect(telescope)
+
+    plt.show()
@@ -3,26 +3,23 @@ from matplotlib import pyplot as plt
 from ttt.rtlsdr import RTLSDR
 from ttt.plots import plot_spectrum
 
-min_gain = 5
-max_gain = 100
-gain_step = 5
+MAX_CLIP = 1e-3  # largest acceptable fraction of clipped ADC samples
+MIN_FLATNESS = None  # smallest acceptable spectral flatness, None to only report
 
 
 if __name__ == "__main__":
-    with RTLSDR(integration_time=1, gain=min_gain) as rtl:
-        try:
-            plt.ion()
-            freqs, powers, _ = rtl.take_exposure()
-            graph = plot_spectrum(freqs, powers, f"Spectrum for Gain {min_gain} dB")
-            for gain in range(min_gain, max_gain + 1, gain_step):
-                rtl.set_gain(gain)
-                freqs, powers, overhead_time = rtl.take_exposure()
-                print(f"Overhead time: {overhead_time.total_seconds()} seconds")
-                graph = plot_spectrum(
-                    freqs, powers, f"Spectrum for Gain {gain} dB", graph
-                )
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        finally:
-            plt.ioff()
-            plt.show()
+    with RTLSDR(integration_time=1) as rtl:
+        calibration = rtl.calibrate_gain(MAX_CLIP, MIN_FLATNESS)
+        print(f"{'gain dB':>8} {'clipped':>9} {'RMS counts':>11} {'flatness':>9}")
+        for m in calibration.measurements:
+            print(
+                f"{m.gain:>8.1f} {m.clip_fraction:>9.2e} "
+                f"{m.rms_counts:>11.1f} {m.flatness:>9.3f}"
+            )
+        print(f"Chosen gain: {calibration.gain} dB")
+
+        freqs, powers, overhead_time = rtl.take_exposure()
+        print(f"Overhead time: {overhead_time.total_seconds()} seconds")
+
+    plot_spectrum(freqs, powers, f"Spectrum for Gain {calibration.gain} dB")
+    plt.show()
@@ -5,15 +5,15 @@ from matplotlib import pyplot as plt
 
 from ttt.mount_ascom import choose_driver, connect, slew_ra_dec, disconnect
 
-from ttt.rtlsdr import RTLSDR
+from ttt.daemon import open_rtlsdr
 from ttt.plots import plot_spectrum
 from ttt.file_io import (
-    save_spectrum,
     file_path,
     load_on_off_spectrum,
 )
 from ttt.utils import SpectrumType
 from ttt.interface import print_instruction
+from ttt.writer import AsyncSpectrumWriter
 
 INTEGRATION_TIME = 180  # seconds, changed to 180 from 1 second
 GAIN = 50  # dB
@@ -36,7 +36,9 @@ if __name__ == "__main__":
 
     try:
         time_stamp = datetime.now()
-        with RTLSDR(
+        # The writer saves while the mount slews; leaving its with-block
+        # waits until both spectra are on disk.
+        with AsyncSpectrumWriter() as writer, open_rtlsdr(
             integration_time=INTEGRATION_TIME, gain=GAIN, bin_size=BIN_SIZE
         ) as rtl:
 
@@ -46,7 +48,14 @@ if __name__ == "__main__":
             print("Taking Off Observation")
             freqs, powers, overhead_time = rtl.take_exposure()
             off_filename = file_path(SpectrumType.OFF, time_stamp, GAIN, INTEGRATION_TIME)
-            save_spectrum(freqs, powers, off_filename)
+            with rtl.stage("save"):
+                writer.save(
+                    freqs,
+                    powers,
+                    off_filename,
+                    flags=rtl.flags,
+                    pointing=(OFF_RA, OFF_DEC),
+                )
 
             # take on observation:
             print("Pointing the antenna at the on position (RA: {}, Dec: {})".format(TARGET_RA, TARGET_DEC))
@@ -54,7 +63,14 @@ if __name__ == "__main__":
             print("Taking On Observation")
             freqs, powers, overhead_time = rtl.take_exposure()
             on_filename = file_path(SpectrumType.ON, time_stamp, GAIN, INTEGRATION_TIME)
-            save_spectrum(freqs, powers, on_filename)
+            with rtl.stage("save"):
+                writer.save(
+                    freqs,
+                    powers,
+                    on_filename,
+                    flags=rtl.flags,
+                    pointing=(TARGET_RA, TARGET_DEC),
+                )
     finally:
         disconnect(telescope)
 
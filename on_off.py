@@ -5,15 +5,15 @@ import os
 import numpy as np
 from matplotlib import pyplot as plt
 
-from ttt.rtlsdr import RTLSDR
+from ttt.daemon import open_rtlsdr
 from ttt.plots import plot_spectrum
 from ttt.file_io import (
-    save_spectrum,
     file_path,
     load_on_off_spectrum,
 )
 from ttt.utils import SpectrumType
 from ttt.interface import print_instruction
+from ttt.writer import AsyncSpectrumWriter
 
 INTEGRATION_TIME = 90  # seconds
 GAIN = 50  # dB
@@ -22,7 +22,11 @@ BIN_SIZE = 512
 
 if __name__ == "__main__":
     time_stamp = datetime.now()
-    with RTLSDR(integration_time=INTEGRATION_TIME, gain=GAIN, bin_size=BIN_SIZE) as rtl:
+    # The writer saves in the background; leaving its with-block waits until
+    # both spectra are on disk.
+    with AsyncSpectrumWriter() as writer, open_rtlsdr(
+        integration_time=INTEGRATION_TIME, gain=GAIN, bin_size=BIN_SIZE
+    ) as rtl:
 
         # off observation first:
         print_instruction(
@@ -31,7 +35,8 @@ if __name__ == "__main__":
 
         freqs, powers, overhead_time = rtl.take_exposure()
         off_filename = file_path(SpectrumType.OFF, time_stamp, GAIN, INTEGRATION_TIME)
-        save_spectrum(freqs, powers, off_filename)
+        with rtl.stage("save"):
+            writer.save(freqs, powers, off_filename, flags=rtl.flags)
 
         # take on observation:
         print_instruction(
@@ -39,7 +44,8 @@ if __name__ == "__main__":
         )
         freqs, powers, overhead_time = rtl.take_exposure()
         on_filename = file_path(SpectrumType.ON, time_stamp, GAIN, INTEGRATION_TIME)
-        save_spectrum(freqs, powers, on_filename)
+        with rtl.stage("save"):
+            writer.save(freqs, powers, on_filename, flags=rtl.flags)
 
     # load the on and off spectra
     freqs, on_off_powers = load_on_off_spectrum(time_stamp, GAIN, INTEGRATION_TIME)
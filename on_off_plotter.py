@@ -2,6 +2,7 @@ import os
 
 from matplotlib import pyplot as plt
 
+from ttt.analysis import fit_baselines, line_free_mask
 from ttt.file_io import (
     load_observation_dates,
     load_observation_paths,
@@ -10,6 +11,8 @@ from ttt.file_io import (
 )
 from ttt.interface import print_instruction
 from ttt.plots import plot_on_off_spectrum, plot_spectrum
+from ttt.spectrum import LINE_HALF_WIDTH
+from ttt.utils import H1_LINE
 
 
 if __name__ == "__main__":
@@ -57,6 +60,13 @@ if __name__ == "__main__":
     # plot the on-off spectrum
     plot_spectrum(freqs, powers, title)
 
+    # and again with the bandpass ripple removed
+    line_window = (H1_LINE * 1e6 - LINE_HALF_WIDTH, H1_LINE * 1e6 + LINE_HALF_WIDTH)
+    mask = line_free_mask(freqs, [line_window], powers)
+    baselines, _ = fit_baselines(freqs, powers, mask)
+    plt.figure()
+    plot_spectrum(freqs, powers - baselines[0], f"Baseline-subtracted {title}")
+
     freqs, on_powers, off_powers = load_on_and_off_spectrum_from_observation(user_date, user_obs)
     plot_on_off_spectrum(freqs, on_powers, off_powers)
     plt.show()
@@ -2,17 +2,19 @@ from matplotlib import pyplot as plt
 
 from ttt.interface import print_instruction
 from ttt.plots import plot_spectrum
-from ttt.rtlsdr import RTLSDR
+from ttt.daemon import open_rtlsdr
 
 INTEGRATION_TIME = 15  # seconds
 GAIN = 50  # dB
 BIN_SIZE = 512
+UPDATE_INTERVAL = 1  # seconds between live plot updates
+TARGET_SNR = None  # stop early once the H I line reaches this SNR
 
 
 if __name__ == "__main__":
     print_instruction(["Taking Quick Exposure", "Point the antenna at the target"])
 
-    with RTLSDR(
+    with open_rtlsdr(
         integration_time=INTEGRATION_TIME,
         gain=GAIN,
         bin_size=BIN_SIZE,
@@ -21,8 +23,20 @@ if __name__ == "__main__":
             "Bias tee is ON. Measure the unloaded SMA voltage now, "
             "then press Enter to expose..."
         )
-        freqs, powers, overhead_time = rtl.take_exposure()
+        plt.ion()
+        graph = None
+        for update in rtl.iter_exposure(UPDATE_INTERVAL, TARGET_SNR):
+            graph = plot_spectrum(
+                update.freqs,
+                update.powers,
+                f"Quick Exposure ({update.elapsed:.0f} s, SNR {update.snr:.1f})",
+                graph,
+            )
 
-    print(f"Overhead time: {overhead_time.total_seconds():.3f} seconds")
-    plot_spectrum(freqs, powers, "Quick Exposure")
+    print(
+        f"Integrated {update.elapsed:.1f} seconds, "
+        f"noise {update.noise:.3f} dB, H I SNR {update.snr:.1f}, "
+        f"{update.dropped} blocks dropped"
+    )
+    plt.ioff()
     plt.show()
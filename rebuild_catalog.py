@@ -0,0 +1,7 @@
+from ttt.file_io import rebuild_catalog
+
+
+if __name__ == "__main__":
+    # Needed once for archives saved before the catalog existed, or after
+    # copying observations in by hand.
+    rebuild_catalog()
@@ -0,0 +1,26 @@
+from ttt.analysis import reduce_night
+from ttt.file_io import load_observation_dates
+
+DATE = None  # date folder such as "20250101"; None reduces the latest night
+VELOCITY = True  # LSR velocity axis; needs pointings in the catalog
+BASELINE = "polynomial"  # or "spline"
+LINE_WINDOW = None  # (low, high) in km/s or Hz; None for the default window
+WORKERS = None  # processes for the Gaussian fits, None for one per CPU
+
+
+if __name__ == "__main__":
+    date_str = DATE or max(load_observation_dates())
+    reduction = reduce_night(
+        date_str, VELOCITY, BASELINE, line_window=LINE_WINDOW, workers=WORKERS
+    )
+    unit = "km/s" if VELOCITY else "Hz"
+    for observation_str, noise, fit in zip(
+        reduction.observations, reduction.noise, reduction.fits
+    ):
+        print(f"{observation_str}: noise {noise:.4f} dB, chi2 {fit.chi2:.2f}")
+        for component, error in zip(fit.components, fit.errors):
+            print(
+                f"    {component.amplitude:.3f} dB at "
+                f"{component.center:.2f} +/- {error.center:.2f} {unit}, "
+                f"sigma {component.width:.2f} {unit}"
+            )
@@ -0,0 +1,10 @@
+import os
+
+from ttt.reprocess import reprocess_archive
+
+WORKERS = os.cpu_count()
+FORCE = False  # reprocess everything, even observations with unchanged inputs
+
+
+if __name__ == "__main__":
+    reprocess_archive(WORKERS, FORCE)
@@ -4,12 +4,9 @@ from astropy import units as u
 from astropy.time import Time
 
 from ttt.mount_ascom import choose_driver, connect
+from ttt.utils import GREEN_BANK_ELEVATION, GREEN_BANK_LATITUDE, GREEN_BANK_LONGITUDE
 
 
-# Green Bank Telescope coordinates published by Green Bank Observatory.
-GREEN_BANK_LATITUDE = 38 + 25 / 60 + 59.236 / 3600
-GREEN_BANK_LONGITUDE = -(79 + 50 / 60 + 23.406 / 3600)
-GREEN_BANK_ELEVATION = 807.43
 NORTH_CELESTIAL_POLE_DEC = 90.0
 
 
@@ -0,0 +1,356 @@
+"""Baseline removal and Gaussian decomposition of H I spectra.
+
+ON minus OFF still carries a bandpass ripple. It is removed by fitting a
+smooth baseline to the channels clear of the line. Every spectrum of a batch
+shares one channel axis and one line-free mask, so the basis is built once
+and the whole batch is a single least-squares solve with one right-hand
+side per spectrum.
+
+What is left is decomposed into Gaussian components with scipy, one
+spectrum per task across a pool of worker processes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import NamedTuple
+
+import numpy as np
+from scipy import interpolate, optimize, signal
+
+from . import file_io
+from .spectrum import LINE_HALF_WIDTH
+from .utils import H1_LINE, SpectrumType
+from .velocity import SPEED_OF_LIGHT, correct_observations
+
+# The line window of spectrum.LINE_HALF_WIDTH, as a velocity.
+LINE_HALF_VELOCITY = LINE_HALF_WIDTH * SPEED_OF_LIGHT / (H1_LINE * 1e6)  # km/s
+EDGE_TRIM = 0.05  # fraction of channels at each edge left out of baselines
+FWHM_TO_SIGMA = 1 / (2 * np.sqrt(2 * np.log(2)))
+
+
+class GaussianComponent(NamedTuple):
+    """One Gaussian line component."""
+
+    amplitude: float  # peak, in the spectrum's units
+    center: float  # in the axis' units
+    width: float  # standard deviation, in the axis' units
+
+
+class LineFit(NamedTuple):
+    """The Gaussian decomposition of one spectrum."""
+
+    components: list[GaussianComponent]  # ascending center
+    errors: list[GaussianComponent]  # one-sigma uncertainty of each component
+    noise: float  # per-channel noise the fit assumed
+    chi2: float  # reduced chi-squared of the fit, or of zero if no components
+
+
+class NightReduction(NamedTuple):
+    """The outcome of reduce_night."""
+
+    axis: np.ndarray  # km/s in the LSR frame, or Hz
+    spectra: np.ndarray  # baseline-subtracted, one row per observation
+    baselines: np.ndarray  # the baselines subtracted
+    noise: np.ndarray  # RMS of each spectrum's line-free residual
+    fits: list[LineFit]  # one per observation
+    observations: list[str]  # observation folder names, in row order
+
+
+def line_free_mask(
+    axis: np.ndarray,
+    line_windows: list[tuple[float, float]],
+    spectra: np.ndarray | None = None,
+    edge: float = EDGE_TRIM,
+) -> np.ndarray:
+    """
+    Channels to fit baselines to.
+    Args:
+        axis (np.ndarray): Channel frequencies or velocities.
+        line_windows (list[tuple[float, float]]): (low, high) ranges of axis
+            that may hold emission.
+        spectra (np.ndarray): If given, channels that are not finite in
+            every spectrum are left out too, so the mask suits all of them.
+        edge (float): Fraction of channels dropped at each edge, where the
+            RTL-SDR's anti-alias filter rolls off.
+    Returns:
+        np.ndarray: True for the line-free channels.
+    """
+    mask = np.ones(axis.size, dtype=bool)
+    n_edge = int(axis.size * edge)
+    mask[:n_edge] = False
+    mask[axis.size - n_edge :] = False
+    for low, high in line_windows:
+        mask &= (axis < low) | (axis > high)
+    if spectra is not None:
+        mask &= np.isfinite(np.atleast_2d(spectra)).all(axis=0)
+    return mask
+
+
+def baseline_basis(
+    axis: np.ndarray,
+    kind: str = "polynomial",
+    order: int = 3,
+    knots: int = 8,
+    mask: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Design matrix of a baseline model, one column per basis function.
+    Args:
+        axis (np.ndarray): Channel frequencies or velocities.
+        kind (str): "polynomial" for a Legendre polynomial, or "spline" for
+            a cubic B-spline.
+        order (int): Polynomial order.
+        knots (int): Interior spline knots.
+        mask (np.ndarray): Channels the spline will be fitted to; knots are
+            spread evenly over them so that none falls in a gap.
+    Returns:
+        np.ndarray: (channels, basis functions) design matrix.
+    """
+    # Scaled to [-1, 1] so the fit stays well conditioned in Hz or km/s.
+    x = 2 * (axis - axis.min()) / (axis.max() - axis.min()) - 1
+    if kind == "polynomial":
+        return np.polynomial.legendre.legvander(x, order)
+    if kind == "spline":
+        fitted = x if mask is None else x[mask]
+        interior = np.quantile(fitted, np.linspace(0, 1, knots + 2)[1:-1])
+        t = np.concatenate([[x.min()] * 4, interior, [x.max()] * 4])
+        return interpolate.BSpline.design_matrix(x, t, 3).toarray()
+    raise ValueError(f"Unknown baseline kind: {kind}")
+
+
+def fit_baselines(
+    axis: np.ndarray,
+    spectra: np.ndarray,
+    mask: np.ndarray,
+    kind: str = "polynomial",
+    order: int = 3,
+    knots: int = 8,
+):
+    """
+    Fit a baseline to every spectrum at once.
+    Spectra finite on every masked channel share one least-squares solve;
+    any others are fitted one at a time to their own finite channels.
+    Args:
+        axis (np.ndarray): Channel frequencies or velocities.
+        spectra (np.ndarray): One spectrum per row.
+        mask (np.ndarray): Line-free channels, from line_free_mask.
+        kind (str): "polynomial" or "spline", see baseline_basis.
+        order (int): Polynomial order.
+        knots (int): Interior spline knots.
+    Returns:
+        baselines: float[][] The fitted baselines, NaN for a spectrum with
+            too few channels to fit.
+        noise: float[] RMS of each spectrum's residual on the masked channels.
+    """
+    spectra = np.atleast_2d(spectra)
+    basis = baseline_basis(axis, kind, order, knots, mask)
+    if mask.sum() < basis.shape[1]:
+        raise ValueError("The mask leaves fewer channels than baseline terms.")
+    masked = spectra[:, mask]
+    shared = np.isfinite(masked).all(axis=1)
+
+    coefficients = np.full((spectra.shape[0], basis.shape[1]), np.nan)
+    if shared.any():
+        solution, *_ = np.linalg.lstsq(basis[mask], masked[shared].T, rcond=None)
+        coefficients[shared] = solution.T
+    for i in np.flatnonzero(~shared):
+        good = np.isfinite(masked[i])
+        if good.sum() >= basis.shape[1]:
+            coefficients[i], *_ = np.linalg.lstsq(
+                basis[mask][good], masked[i, good], rcond=None
+            )
+
+    baselines = coefficients @ basis.T
+    residual = masked - baselines[:, mask]
+    noise = np.sqrt(np.nanmean(residual**2, axis=1))
+    return baselines, noise
+
+
+def _gaussians(x: np.ndarray, *params) -> np.ndarray:
+    p = np.reshape(params, (-1, 3))
+    amplitude, center, width = p[:, :1], p[:, 1:2], p[:, 2:]
+    return (amplitude * np.exp(-0.5 * ((x - center) / width) ** 2)).sum(axis=0)
+
+
+def _gaussians_jacobian(x: np.ndarray, *params) -> np.ndarray:
+    p = np.reshape(params, (-1, 3))
+    amplitude, center, width = p[:, :1], p[:, 1:2], p[:, 2:]
+    z = (x - center) / width
+    shape = np.exp(-0.5 * z**2)
+    d_center = amplitude * shape * z / width
+    jacobian = np.stack([shape, d_center, d_center * z], axis=1)
+    return jacobian.reshape(-1, x.size).T
+
+
+def fit_gaussians(
+    axis: np.ndarray,
+    spectrum: np.ndarray,
+    noise: float,
+    max_components: int = 3,
+    window: tuple[float, float] | None = None,
+    min_snr: float = 3.0,
+) -> LineFit:
+    """
+    Decompose a baseline-subtracted spectrum into Gaussian components.
+    Components are added one at a time, each seeded at the highest peak of
+    what the previous fit left, and all are refitted together. Adding stops
+    when no peak reaches min_snr or the Bayesian information criterion no
+    longer improves, so noise is not fitted as extra components.
+    Args:
+        axis (np.ndarray): Channel frequencies or velocities, ascending.
+        spectrum (np.ndarray): Baseline-subtracted spectrum.
+        noise (float): Per-channel noise.
+        max_components (int): Most components to fit.
+        window (tuple[float, float]): (low, high) range of axis to fit.
+        min_snr (float): Smallest peak, over the noise, that seeds a component.
+    Returns:
+        LineFit: The components.
+    """
+    noise = float(noise)
+    use = np.isfinite(spectrum)
+    if window is not None:
+        use &= (axis >= window[0]) & (axis <= window[1])
+    x, y = axis[use], spectrum[use]
+    if not np.isfinite(noise) or noise <= 0 or x.size < 8:
+        return LineFit([], [], noise, np.nan)
+
+    step = float(np.median(np.diff(x)))
+    smoothing = np.ones(5) / 5  # for finding peaks only
+    params = np.empty(0)
+    chi2 = float(np.sum((y / noise) ** 2))
+    best = LineFit([], [], noise, chi2 / y.size)
+    best_bic = chi2
+    for n in range(1, max_components + 1):
+        residual = np.convolve(y - _gaussians(x, *params), smoothing, mode="same")
+        peak = int(np.argmax(residual))
+        if residual[peak] < min_snr * noise / np.sqrt(smoothing.size):
+            break
+        fwhm = signal.peak_widths(residual, [peak])[0][0] * step
+        seed = [residual[peak], x[peak], max(fwhm * FWHM_TO_SIGMA, step)]
+        try:
+            params, covariance = optimize.curve_fit(
+                _gaussians,
+                x,
+                y,
+                p0=np.concatenate([params, seed]),
+                sigma=np.full(y.size, noise),
+                absolute_sigma=True,
+                bounds=(
+                    [0, x[0], step / 2] * n,
+                    [np.inf, x[-1], (x[-1] - x[0]) / 2] * n,
+                ),
+                jac=_gaussians_jacobian,
+            )
+        except (RuntimeError, ValueError):
+            break
+        chi2 = float(np.sum(((y - _gaussians(x, *params)) / noise) ** 2))
+        bic = chi2 + 3 * n * np.log(y.size)
+        if bic >= best_bic:
+            break
+        order = np.argsort(params[1::3])
+        errors = np.sqrt(np.diag(covariance)).reshape(-1, 3)[order].tolist()
+        best_bic = bic
+        best = LineFit(
+            [GaussianComponent(*c) for c in params.reshape(-1, 3)[order].tolist()],
+            [GaussianComponent(*e) for e in errors],
+            noise,
+            chi2 / max(y.size - 3 * n, 1),
+        )
+    return best
+
+
+def _fit_row(axis, max_components, window, min_snr, spectrum, noise):
+    return fit_gaussians(axis, spectrum, noise, max_components, window, min_snr)
+
+
+def fit_lines(
+    axis: np.ndarray,
+    spectra: np.ndarray,
+    noise: np.ndarray,
+    max_components: int = 3,
+    window: tuple[float, float] | None = None,
+    min_snr: float = 3.0,
+    workers: int | None = None,
+    chunksize: int = 16,
+) -> list[LineFit]:
+    """
+    Decompose many spectra into Gaussian components in parallel.
+    Args:
+        axis (np.ndarray): Channel frequencies or velocities, ascending.
+        spectra (np.ndarray): Baseline-subtracted spectra, one per row.
+        noise (np.ndarray): Per-channel noise of each spectrum.
+        max_components (int): Most components per spectrum.
+        window (tuple[float, float]): (low, high) range of axis to fit.
+        min_snr (float): Smallest peak, over the noise, that seeds a component.
+        workers (int): Worker processes; defaults to one per CPU, and 1 fits
+            in this process.
+        chunksize (int): Spectra handed to a worker at a time.
+    Returns:
+        list[LineFit]: One fit per spectrum, in order.
+    """
+    fit = partial(_fit_row, axis, max_components, window, min_snr)
+    spectra = np.atleast_2d(spectra)
+    noise = np.broadcast_to(noise, spectra.shape[:1])
+    workers = min(workers or os.cpu_count() or 1, -(-len(spectra) // chunksize))
+    if workers <= 1:
+        return list(map(fit, spectra, noise))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fit, spectra, noise, chunksize=chunksize))
+
+
+def reduce_night(
+    date_str: str,
+    velocity: bool = True,
+    kind: str = "polynomial",
+    order: int = 3,
+    knots: int = 8,
+    max_components: int = 3,
+    line_window: tuple[float, float] | None = None,
+    workers: int | None = None,
+) -> NightReduction:
+    """
+    Remove baselines from and decompose every ON minus OFF spectrum of a
+    night, found through the catalog.
+    Args:
+        date_str (str): Date folder, e.g. "20250101".
+        velocity (bool): Work on a common LSR velocity axis, skipping
+            observations without a pointing; otherwise on the frequency
+            axis, which every observation must share.
+        kind (str): Baseline kind, "polynomial" or "spline".
+        order (int): Baseline polynomial order.
+        knots (int): Interior baseline spline knots.
+        max_components (int): Most Gaussian components per spectrum.
+        line_window (tuple[float, float]): (low, high) range of the axis
+            that may hold emission, left out of the baselines and searched
+            for components; defaults to LINE_HALF_WIDTH about the line.
+        workers (int): Worker processes for the Gaussian fits.
+    Returns:
+        NightReduction: The reduced night.
+    """
+    rows = file_io.query_catalog(SpectrumType.ON, date=date_str)
+    if not rows:
+        raise ValueError(f"No cataloged observations for {date_str}.")
+    if velocity:
+        axis, spectra, rows = correct_observations(rows)
+        default_window = (-LINE_HALF_VELOCITY, LINE_HALF_VELOCITY)
+    else:
+        observations = [
+            file_io.load_observation(date_str, r["observation"]) for r in rows
+        ]
+        axis = observations[0].freqs
+        if not all(np.array_equal(o.freqs, axis) for o in observations):
+            raise ValueError(f"The observations of {date_str} differ in frequency.")
+        spectra = np.array([o.difference for o in observations])
+        line_freq = H1_LINE * 1e6
+        default_window = (line_freq - LINE_HALF_WIDTH, line_freq + LINE_HALF_WIDTH)
+    window = line_window or default_window
+
+    mask = line_free_mask(axis, [window], spectra)
+    baselines, noise = fit_baselines(axis, spectra, mask, kind, order, knots)
+    spectra = spectra - baselines
+    fits = fit_lines(axis, spectra, noise, max_components, window, workers=workers)
+    print(f"Reduced {len(rows)} observations from {date_str}.")
+    return NightReduction(
+        axis, spectra, baselines, noise, fits, [r["observation"] for r in rows]
+    )
@@ -0,0 +1,444 @@
+"""A local daemon that keeps the RTL-SDR open between scripts.
+
+The daemon opens the dongle once, turns the bias tee on and leaves it on, so
+the LNA stays powered and at a steady temperature instead of cycling with
+every script. Between requests it keeps reading and discarding samples, so
+the tuner and ADC stay at their working temperature too.
+
+Scripts talk to it over a Unix socket. Each message is a 4-byte big-endian
+length, a JSON header, and then the raw bytes of any arrays the header lists.
+Arrays are sent straight from their NumPy buffers and received straight into
+freshly allocated ones, with no pickling or intermediate copies. Requests
+from several scripts are queued and served one at a time, in arrival order.
+
+    python acquisition_daemon.py        # owns the dongle
+    python on_off.py                    # uses the daemon when it is running
+
+open_rtlsdr returns a client when a daemon is listening and an RTLSDR
+otherwise, so scripts work the same either way.
+"""
+
+import json
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+from contextlib import nullcontext
+from datetime import timedelta
+
+import numpy as np
+
+from .rtlsdr import RTLSDR, ExposureUpdate
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "ttt-rtlsdr.sock")
+KEEP_WARM_INTERVAL = 0.5  # seconds idle before each keep-warm read
+KEEP_WARM_SAMPLES = 16384  # samples read and discarded per keep-warm read
+CLIENT_TIMEOUT = 900.0  # seconds a client waits for each reply, queueing included
+
+_LENGTH = struct.Struct("!I")
+
+
+def send_message(sock: socket.socket, header: dict, arrays: dict | None = None):
+    """
+    Send a header and arrays as one message.
+    Args:
+        sock (socket.socket): Connected socket.
+        header (dict): JSON-serialisable header.
+        arrays (dict): Arrays by name, sent from their own buffers.
+    """
+    arrays = {
+        name: np.ascontiguousarray(array) for name, array in (arrays or {}).items()
+    }
+    header = dict(
+        header,
+        arrays=[[name, a.dtype.str, a.shape] for name, a in arrays.items()],
+    )
+    encoded = json.dumps(header).encode()
+    sock.sendall(_LENGTH.pack(len(encoded)) + encoded)
+    for array in arrays.values():
+        if array.size:
+            sock.sendall(memoryview(array).cast("B"))
+
+
+def _recv_into(sock: socket.socket, view: memoryview):
+    while len(view):
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("Connection closed mid-message.")
+        view = view[received:]
+
+
+def recv_message(sock: socket.socket):
+    """
+    Receive one message sent by send_message.
+    Args:
+        sock (socket.socket): Connected socket.
+    Returns:
+        header: dict The header.
+        arrays: dict Arrays by name, each received directly into its buffer.
+    """
+    length = bytearray(_LENGTH.size)
+    _recv_into(sock, memoryview(length))
+    encoded = bytearray(_LENGTH.unpack(length)[0])
+    _recv_into(sock, memoryview(encoded))
+    header = json.loads(encoded)
+    arrays = {}
+    for name, dtype, shape in header.pop("arrays"):
+        array = np.empty(shape, dtype=dtype)
+        if array.size:
+            _recv_into(sock, memoryview(array).cast("B"))
+        arrays[name] = array
+    return header, arrays
+
+
+class _Job:
+    """One request, waiting in the queue with the connection to answer on."""
+
+    def __init__(self, request: dict, connection: socket.socket):
+        self.request = request
+        self.connection = connection
+        self.done = threading.Event()
+
+
+class AcquisitionDaemon:
+    """Owns an RTLSDR and serves exposures to local clients."""
+
+    def __init__(
+        self,
+        socket_path: str = DEFAULT_SOCKET,
+        keep_warm: bool = True,
+        **rtlsdr_kwargs,
+    ):
+        """
+        Args:
+            socket_path (str): Path of the Unix socket to listen on.
+            keep_warm (bool): Read and discard samples while idle.
+            **rtlsdr_kwargs: Passed to RTLSDR, e.g. gain, bin_size or engine.
+        """
+        self.socket_path = socket_path
+        self.keep_warm = keep_warm
+        self._rtlsdr_kwargs = rtlsdr_kwargs
+        self._jobs = queue.Queue()
+
+    def serve_forever(self):
+        """
+        Open the dongle and serve requests until interrupted or shut down.
+        """
+        import socketserver
+
+        if daemon_running(self.socket_path):
+            raise RuntimeError(f"A daemon is already listening on {self.socket_path}.")
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # left behind by a daemon that died
+
+        jobs = self._jobs
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        request, _ = recv_message(self.request)
+                    except (ConnectionError, OSError):
+                        return
+                    job = _Job(request, self.request)
+                    jobs.put(job)
+                    job.done.wait()
+
+        with RTLSDR(**self._rtlsdr_kwargs) as rtl:
+            server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            print(f"Acquisition daemon listening on {self.socket_path}")
+            try:
+                while True:
+                    try:
+                        job = jobs.get(timeout=KEEP_WARM_INTERVAL)
+                    except queue.Empty:
+                        if self.keep_warm:
+                            self._keep_warm(rtl)
+                        continue
+                    if job is None:
+                        break
+                    try:
+                        self._serve(rtl, job.request, job.connection)
+                    except (ConnectionError, OSError) as e:
+                        print(f"Client went away: {e}")
+                    except Exception as e:
+                        # A bad request must not take the daemon down.
+                        print(f"Request failed: {e!r}")
+                        try:
+                            send_message(job.connection, {"error": repr(e)})
+                        except OSError:
+                            pass
+                    finally:
+                        job.done.set()
+            finally:
+                server.shutdown()
+                server.server_close()
+                os.unlink(self.socket_path)
+                print("Acquisition daemon stopped.")
+
+    def _keep_warm(self, rtl: RTLSDR):
+        # An idle USB error must not take the daemon down either; reconnect
+        # as long_exposure does, and try again on the next idle tick if that
+        # fails too.
+        try:
+            rtl.sdr.read_bytes(2 * KEEP_WARM_SAMPLES)
+        except Exception as e:
+            print(f"Keep-warm read failed ({e!r}); reconnecting.")
+            try:
+                rtl.reconnect()
+            except Exception as reconnect_error:
+                print(f"Reconnect failed: {reconnect_error!r}")
+
+    def shutdown(self):
+        """
+        Stop serve_forever once the requests already queued are served.
+        """
+        self._jobs.put(None)
+
+    def _serve(self, rtl: RTLSDR, request: dict, connection: socket.socket):
+        command = request.get("command")
+        if command == "status":
+            send_message(connection, self._status(rtl))
+            return
+        if command not in ("exposure", "iter_exposure"):
+            send_message(connection, {"error": f"Unknown command {command!r}."})
+            return
+        status = self._status(rtl)
+        if request.get("bin_size", status["bin_size"]) != status["bin_size"]:
+            send_message(
+                connection,
+                {"error": f"The daemon runs with bin_size {status['bin_size']}."},
+            )
+            return
+        if request.get("gain") is not None and request["gain"] != rtl.get_gain:
+            rtl.set_gain(request["gain"])
+        if request.get("center_freq") is not None:
+            if request["center_freq"] * 1e6 != rtl.get_center_freq:
+                rtl.set_center_freq(request["center_freq"])
+        if request.get("integration_time") is not None:
+            rtl.set_integration_time(request["integration_time"])
+
+        if command == "exposure":
+            freqs, powers, overhead_time = rtl.take_exposure()
+            header = {
+                "overhead": overhead_time.total_seconds(),
+                "dropped": rtl.dropped_blocks,
+            }
+            if powers is None:
+                send_message(connection, dict(header, failed=True))
+                return
+            arrays = {"freqs": freqs, "powers": powers}
+            if rtl.flags is not None:
+                arrays["flags"] = rtl.flags
+            send_message(connection, header, arrays)
+            return
+
+        updates = rtl.iter_exposure(request.get("interval", 5.0), request.get("target_snr"))
+        try:
+            for update in updates:
+                send_message(
+                    connection,
+                    {
+                        "elapsed": update.elapsed,
+                        "noise": float(update.noise),
+                        "snr": float(update.snr),
+                        "dropped": update.dropped,
+                    },
+                    {"freqs": update.freqs, "powers": update.powers},
+                )
+        finally:
+            updates.close()
+        send_message(connection, {"done": True})
+
+    @staticmethod
+    def _status(rtl: RTLSDR) -> dict:
+        return {
+            "bin_size": rtl._bin_size,
+            "sample_rate": rtl._sample_rate,
+            "center_freq": rtl.get_center_freq,
+            "gain": rtl.get_gain,
+            "integration_time": rtl._integration_time,
+        }
+
+
+class DaemonClient:
+    """
+    Takes exposures through the acquisition daemon, with the same
+    take_exposure, iter_exposure and stage methods as RTLSDR.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = DEFAULT_SOCKET,
+        integration_time: float | None = None,
+        gain: float | None = None,
+        bin_size: int | None = None,
+        center_freq: float | None = None,
+        timeout: float | None = CLIENT_TIMEOUT,
+    ):
+        """
+        Args:
+            socket_path (str): Path of the daemon's Unix socket.
+            integration_time (float): Seconds per exposure; the daemon's
+                current setting if None.
+            gain (float): Gain in dB; the daemon's current setting if None.
+            bin_size (int): Expected bin size; the daemon refuses exposures
+                if it runs with a different one.
+            center_freq (float): Center frequency in MHz; the daemon's
+                current setting if None.
+            timeout (float): Seconds to wait for each reply, including time
+                spent behind other clients' requests; None waits forever.
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._settings = {
+            "integration_time": integration_time,
+            "gain": gain,
+            "bin_size": bin_size,
+            "center_freq": center_freq,
+        }
+        self._sock = None
+        self.dropped_blocks = 0
+        self.flags = None
+
+    def __enter__(self):
+        self._connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._sock.close()
+        self._sock = None
+
+    def _connect(self):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(self.timeout)
+        self._sock.connect(self.socket_path)
+
+    def _receive(self):
+        try:
+            header, arrays = recv_message(self._sock)
+        except TimeoutError:
+            raise RuntimeError(
+                f"Acquisition daemon: no reply within {self.timeout} s."
+            ) from None
+        except ConnectionError as e:
+            raise RuntimeError(f"Acquisition daemon: connection lost ({e}).") from None
+        if "error" in header:
+            raise RuntimeError(f"Acquisition daemon: {header['error']}")
+        return header, arrays
+
+    def _request(self, command: str, **params):
+        request = {k: v for k, v in self._settings.items() if v is not None}
+        send_message(self._sock, dict(request, command=command, **params))
+        return self._receive()
+
+    def status(self) -> dict:
+        """
+        The daemon's current settings.
+        Returns:
+            dict: bin_size, sample_rate, center_freq (Hz), gain and
+            integration_time.
+        """
+        return self._request("status")[0]
+
+    def stage(self, name: str):
+        """
+        Stages are timed by the daemon, so this does nothing.
+        """
+        return nullcontext()
+
+    def take_exposure(self):
+        """
+        Take an exposure on the daemon's dongle, waiting for any queued
+        requests first.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB.
+            overhead_time: datetime.timedelta Overhead time taken by the daemon.
+        """
+        header, arrays = self._request("exposure")
+        self.dropped_blocks = header["dropped"]
+        self.flags = arrays.get("flags")
+        overhead_time = timedelta(seconds=header["overhead"])
+        if header.get("failed"):
+            print("Error taking exposure: the daemon's exposure failed.")
+            return None, None, overhead_time
+        return arrays["freqs"], arrays["powers"], overhead_time
+
+    def iter_exposure(self, interval: float = 5.0, target_snr: float | None = None):
+        """
+        Take an exposure on the daemon's dongle, yielding the running
+        average every interval seconds. Breaking out of the loop stops it.
+        Args:
+            interval (float): Seconds of samples between updates.
+            target_snr (float): Stop once the H I line reaches this SNR.
+        Yields:
+            ExposureUpdate: The spectrum so far, with its noise and line SNR.
+        """
+        header, arrays = self._request(
+            "iter_exposure", interval=interval, target_snr=target_snr
+        )
+        finished = False
+        try:
+            while not header.get("done"):
+                self.dropped_blocks = header["dropped"]
+                yield ExposureUpdate(
+                    arrays["freqs"],
+                    arrays["powers"],
+                    header["elapsed"],
+                    header["noise"],
+                    header["snr"],
+                    header["dropped"],
+                )
+                header, arrays = self._receive()
+            finished = True
+        finally:
+            if not finished:
+                # Hanging up stops the daemon's exposure; start afresh.
+                self._sock.close()
+                self._connect()
+
+
+def daemon_running(socket_path: str = DEFAULT_SOCKET) -> bool:
+    """
+    Whether an acquisition daemon is listening on socket_path.
+    Args:
+        socket_path (str): Path of the daemon's Unix socket.
+    Returns:
+        bool: True if a connection succeeds.
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def open_rtlsdr(socket_path: str = DEFAULT_SOCKET, **rtlsdr_kwargs):
+    """
+    Use the acquisition daemon if one is running, or open the dongle directly.
+    Args:
+        socket_path (str): Path of the daemon's Unix socket.
+        **rtlsdr_kwargs: RTLSDR arguments. A daemon is only sent
+            integration_time, gain, bin_size and center_freq.
+    Returns:
+        DaemonClient or RTLSDR: A context manager for taking exposures.
+    """
+    if daemon_running(socket_path):
+        print(f"Using the acquisition daemon on {socket_path}")
+        return DaemonClient(
+            socket_path,
+            **{
+                k: rtlsdr_kwargs[k]
+                for k in ("integration_time", "gain", "bin_size", "center_freq")
+                if k in rtlsdr_kwargs
+            },
+        )
+    return RTLSDR(**rtlsdr_kwargs)
@@ -1,11 +1,44 @@
-from datetime import datetime
+from contextlib import closing
+from datetime import datetime, timezone
+from functools import cached_property, lru_cache
 import os
+import sqlite3
 
 import numpy as np
 
+from .store import (
+    SpectrumStore,
+    decode_powers,
+    encode_powers,
+    frequency_axis,
+    linear_axis,
+)
 from .utils import SpectrumType
 
 DATA_PATH = "data"
+STORE_NAME = "spectra.ttt"  # one per date directory
+CATALOG_NAME = "catalog.sqlite"  # in DATA_PATH, indexes every spectrum
+LOAD_CACHE_SIZE = 256  # spectra kept by load_spectrum
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spectra (
+    utc REAL NOT NULL,
+    date TEXT NOT NULL,
+    observation TEXT NOT NULL,
+    type TEXT NOT NULL,
+    gain REAL NOT NULL,
+    integration_time REAL NOT NULL,
+    center_freq REAL,
+    ra REAL,
+    dec REAL,
+    path TEXT NOT NULL,
+    row INTEGER
+);
+CREATE INDEX IF NOT EXISTS spectra_setup
+    ON spectra (type, gain, integration_time, utc);
+CREATE INDEX IF NOT EXISTS spectra_utc ON spectra (utc);
+CREATE INDEX IF NOT EXISTS spectra_observation ON spectra (date, observation);
+"""
 
 
 def date_path(date: datetime) -> str:
@@ -48,23 +81,534 @@ def file_path(
         str: The file path for the spectrum data.
     """
     _observation_path = observation_path(date, gain, integration_time)
-    if not os.path.exists(_observation_path):
-        os.makedirs(_observation_path, exist_ok=True)
     return os.path.join(_observation_path, f"{spectrum_type.value}.npy")
 
 
-def save_spectrum(freqs: np.ndarray, powers: np.ndarray, filename: str):
+def parse_observation(observation_str: str) -> tuple[str, float, float]:
+    """
+    Split an observation folder name into its parts.
+    Args:
+        observation_str (str): Name like 213005_50dB_180s.
+    Returns:
+        tuple: Time as HHMMSS, gain in dB and integration time in seconds.
+    """
+    time_str, gain, integration_time = observation_str.split("_")
+    return time_str, float(gain[: -len("dB")]), float(integration_time[: -len("s")])
+
+
+def store_path(date_str: str) -> str:
+    """
+    Path of the spectrum store for a date.
+    Args:
+        date_str (str): The date in YYYYMMDD format.
+    Returns:
+        str: The store file path.
+    """
+    return os.path.join(DATA_PATH, date_str, STORE_NAME)
+
+
+def _split_file_path(filename: str):
+    """
+    Recognise a path made by file_path.
+    Returns:
+        tuple: (date_str, observation_str, SpectrumType), or None for any
+        other path.
+    """
+    parts = os.path.normpath(filename).split(os.sep)
+    if len(parts) < 3:
+        return None
+    date_str, observation_str, name = parts[-3:]
+    stem, extension = os.path.splitext(name)
+    if extension != ".npy" or stem not in {t.value for t in SpectrumType}:
+        return None
+    if not (len(date_str) == 8 and date_str.isdigit()):
+        return None
+    try:
+        parse_observation(observation_str)
+    except ValueError:
+        return None
+    return date_str, observation_str, SpectrumType(stem)
+
+
+def recording_path(
+    spectrum_type: SpectrumType, date: datetime, gain: int, integration_time: float
+) -> str:
+    """
+    Generate a path for a raw IQ recording, next to its spectrum data.
+    Args:
+        spectrum_type (SpectrumType): The type of spectrum (ON or OFF).
+        date (datetime): The date of the observation.
+        gain (int): Gain in dB.
+        integration_time (float): Integration time in seconds.
+    Returns:
+        str: The recording path, without extension.
+    """
+    return file_path(spectrum_type, date, gain, integration_time)[: -len(".npy")]
+
+
+@lru_cache(maxsize=4)
+def _store_for_saving(path: str) -> SpectrumStore:
+    # Kept open so that each save only indexes the rows appended since.
+    return SpectrumStore(path)
+
+
+def save_spectrum(
+    freqs: np.ndarray,
+    powers: np.ndarray,
+    filename: str,
+    flags: np.ndarray | None = None,
+    pointing: tuple[float, float] | None = None,
+    compress: bool = False,
+    utc: datetime | None = None,
+):
     """
-    Save the spectrum data to a file.
+    Save the spectrum data. Paths made by file_path are appended to the
+    night's spectrum store (see ttt.store); any other path gets a compact
+    .npz file if it ends in .npz, or a .npy table otherwise.
     Args:
         freqs (np.ndarray): Frequencies in MHz.
         powers (np.ndarray): Powers in dB.
         filename (str): The name of the file to save the data.
+        flags (np.ndarray): Optional RFI mask, True for flagged channels,
+            saved alongside the powers (a third column in a .npy file).
+        pointing (tuple[float, float]): RA in hours and Dec in degrees, kept
+            in the store.
+        compress (bool): Losslessly compress the powers, except in a .npy.
+        utc (datetime): When the spectrum was observed, kept in the store
+            and the catalog; defaults to now.
+    Returns:
+        str: The file written to.
     """
-    # Transpose to have freqs and powers in columns
-    table = np.array([freqs, powers]).T
+    parts = _split_file_path(filename)
+    if parts is not None:
+        date_str, observation_str, spectrum_type = parts
+        _, gain, integration_time = parse_observation(observation_str)
+        date_dir = os.path.dirname(os.path.dirname(filename))
+        path = os.path.join(date_dir, STORE_NAME)
+        utc = utc or datetime.now(timezone.utc)
+        row = _store_for_saving(path).append(
+            freqs,
+            powers,
+            spectrum_type.value,
+            observation_str,
+            gain,
+            integration_time,
+            utc=utc,
+            pointing=pointing,
+            flags=flags,
+            compress=compress,
+        )
+        ra, dec = pointing if pointing is not None else (None, None)
+        with _catalog(os.path.join(os.path.dirname(date_dir), CATALOG_NAME)) as conn:
+            _catalog_insert(
+                conn,
+                [
+                    (
+                        utc.timestamp(),
+                        date_str,
+                        observation_str,
+                        spectrum_type.value,
+                        gain,
+                        integration_time,
+                        _center_freq(freqs),
+                        ra,
+                        dec,
+                        path,
+                        row,
+                    )
+                ],
+            )
+        print(f"Spectrum saved to {path} row {row}")
+        return path
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    if filename.endswith(".npz"):
+        _save_compact(filename, freqs, powers, flags, compress)
+        print(f"Spectrum saved to {filename}")
+        return filename
+    # Transpose to have freqs and powers (and flags) in columns
+    columns = [freqs, powers] if flags is None else [freqs, powers, flags]
+    table = np.array(columns, dtype=float).T
     np.save(filename, table)
     print(f"Spectrum saved to {filename}")
+    # np.save adds the extension when it is missing.
+    return filename if filename.endswith(".npy") else filename + ".npy"
+
+
+def _save_compact(filename, freqs, powers, flags, compress):
+    """
+    Write a spectrum as an .npz with the frequency axis as start, step and
+    count where it is evenly spaced, and the same power encoding as the store.
+    """
+    arrays = {
+        "powers": np.frombuffer(encode_powers(powers, compress), dtype=np.uint8),
+        "count": np.array(len(powers)),
+        "compressed": np.array(compress),
+    }
+    axis = linear_axis(freqs)
+    if axis is None:
+        arrays["freqs"] = np.asarray(freqs, dtype=float)
+    else:
+        arrays["freq_start"], arrays["freq_step"] = np.array(axis[0]), np.array(axis[1])
+    if flags is not None:
+        arrays["flags"] = np.packbits(np.asarray(flags, dtype=bool))
+    np.savez(filename, **arrays)
+
+
+def read_spectrum_file(filename: str, mmap: bool = False):
+    """
+    Read a spectrum saved to its own file, either a compact .npz or a .npy
+    table of the older layout. Evenly spaced frequency axes come back as the
+    shared, read-only arrays of ttt.store.frequency_axis.
+    Args:
+        filename (str): The .npz or .npy file.
+        mmap (bool): Memory-map a .npy read-only and return views into it.
+    Returns:
+        tuple: Frequencies, powers, and the RFI mask or None.
+    """
+    if filename.endswith(".npz"):
+        with np.load(filename) as data:
+            count = int(data["count"])
+            powers = decode_powers(
+                data["powers"].tobytes(), count, bool(data["compressed"])
+            )
+            if "freqs" in data:
+                freqs = data["freqs"]
+            else:
+                freqs = frequency_axis(
+                    float(data["freq_start"]), float(data["freq_step"]), count
+                )
+            flags = None
+            if "flags" in data:
+                flags = np.unpackbits(data["flags"], count=count).astype(bool)
+        return freqs, powers, flags
+    table = np.load(filename, mmap_mode="r" if mmap else None)
+    freqs = table[:, 0]
+    axis = linear_axis(freqs)
+    if axis is not None:
+        freqs = frequency_axis(axis[0], axis[1], len(freqs))
+    flags = table[:, 2].astype(bool) if table.shape[1] > 2 else None
+    return freqs, table[:, 1], flags
+
+
+def _center_freq(freqs: np.ndarray) -> float | None:
+    # The middle bin of an fftshifted axis is the center frequency.
+    return float(freqs[len(freqs) // 2]) if len(freqs) else None
+
+
+def catalog_path() -> str:
+    """
+    Path of the observation catalog.
+    Returns:
+        str: The SQLite database path.
+    """
+    return os.path.join(DATA_PATH, CATALOG_NAME)
+
+
+class _catalog:
+    """Opens the catalog as a transaction, creating it if needed."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(CATALOG_SCHEMA)
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with closing(self._conn):
+            return self._conn.__exit__(exc_type, exc_value, traceback)
+
+
+def _catalog_insert(conn: sqlite3.Connection, rows: list[tuple]):
+    conn.executemany(
+        "INSERT INTO spectra (utc, date, observation, type, gain, integration_time,"
+        " center_freq, ra, dec, path, row) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def _folder_utc(date_str: str, time_str: str) -> datetime:
+    # Folder names are in the observing computer's local time.
+    return datetime.strptime(date_str + time_str, "%Y%m%d%H%M%S").astimezone(
+        timezone.utc
+    )
+
+
+def observation_metadata(
+    date_str: str, observation_str: str, spectrum_type: SpectrumType
+):
+    """
+    When and where a saved spectrum was observed.
+    Args:
+        date_str (str): Date folder, e.g. "20250101".
+        observation_str (str): Observation folder name.
+        spectrum_type (SpectrumType): Type of spectrum.
+    Returns:
+        utc: datetime Time saved in the store, or the observation folder's
+            time for a .npy file.
+        pointing: tuple[float, float] RA in hours and Dec in degrees, or None
+            if none was saved.
+    """
+    path = store_path(date_str)
+    if os.path.exists(path):
+        store = _open_store(path, _file_stamp(path))
+        row = store.find(observation_str, spectrum_type.value)
+        if row is not None:
+            meta = store.rows[row]
+            utc = datetime.fromtimestamp(int(meta["utc"]) / 1e6, timezone.utc)
+            ra, dec = float(meta["ra"]), float(meta["dec"])
+            if np.isnan(ra) or np.isnan(dec):
+                return utc, None
+            return utc, (ra, dec)
+    time_str, _, _ = parse_observation(observation_str)
+    return _folder_utc(date_str, time_str), None
+
+
+def rebuild_catalog() -> int:
+    """
+    Rebuild the observation catalog from the spectrum stores and .npy files
+    under DATA_PATH.
+    Returns:
+        int: Number of spectra catalogued.
+    """
+    rows = []
+    for date_str in load_observation_dates():
+        path = store_path(date_str)
+        stored = set()
+        if os.path.exists(path):
+            store = SpectrumStore(path)
+            for row, meta in enumerate(store.rows):
+                observation_str = meta["observation"].decode()
+                spectrum_type = meta["type"].decode()
+                stored.add((observation_str, spectrum_type))
+                ra, dec = float(meta["ra"]), float(meta["dec"])
+                rows.append(
+                    (
+                        int(meta["utc"]) / 1e6,
+                        date_str,
+                        observation_str,
+                        spectrum_type,
+                        float(meta["gain"]),
+                        float(meta["integration_time"]),
+                        _center_freq(store.read(row)[0]),
+                        None if np.isnan(ra) else ra,
+                        None if np.isnan(dec) else dec,
+                        path,
+                        row,
+                    )
+                )
+        for observation_str in load_observation_paths(date_str):
+            try:
+                time_str, gain, integration_time = parse_observation(observation_str)
+            except ValueError:
+                continue
+            utc = _folder_utc(date_str, time_str)
+            for spectrum_type in SpectrumType:
+                npy = os.path.join(
+                    DATA_PATH, date_str, observation_str, spectrum_type.value + ".npy"
+                )
+                if (observation_str, spectrum_type.value) in stored:
+                    continue
+                if not os.path.exists(npy):
+                    continue
+                table = np.load(npy, mmap_mode="r")
+                rows.append(
+                    (
+                        utc.timestamp(),
+                        date_str,
+                        observation_str,
+                        spectrum_type.value,
+                        gain,
+                        integration_time,
+                        _center_freq(table[:, 0]),
+                        None,
+                        None,
+                        npy,
+                        None,
+                    )
+                )
+    with _catalog(catalog_path()) as conn:
+        conn.execute("DELETE FROM spectra")
+        _catalog_insert(conn, rows)
+    print(f"Catalogued {len(rows)} spectra in {catalog_path()}")
+    return len(rows)
+
+
+def query_catalog(
+    spectrum_type: SpectrumType | None = None,
+    gain: float | None = None,
+    integration_time: float | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    center_freq: tuple[float, float] | None = None,
+    date: str | None = None,
+) -> list[sqlite3.Row]:
+    """
+    Find spectra in the observation catalog. Every argument left as None
+    matches anything.
+    Args:
+        spectrum_type (SpectrumType): Type of spectrum.
+        gain (float): Gain in dB.
+        integration_time (float): Integration time in seconds.
+        start (datetime): Earliest time, inclusive; naive means local time.
+        end (datetime): Latest time, exclusive; naive means local time.
+        center_freq (tuple[float, float]): Lowest and highest center
+            frequency in Hz.
+        date (str): Date folder, e.g. "20250101".
+    Returns:
+        list[sqlite3.Row]: Rows in time order, with columns utc (Unix
+        seconds), date, observation, type, gain, integration_time,
+        center_freq, ra, dec, path and row (None for .npy files).
+    """
+    clauses, params = [], []
+    if spectrum_type is not None:
+        # A date is far more selective than a type; the unary + keeps SQLite
+        # from choosing the type index over the (date, observation) one.
+        clauses.append("+type = ?" if date is not None else "type = ?")
+        params.append(spectrum_type.value)
+    if gain is not None:
+        clauses.append("gain = ?")
+        params.append(gain)
+    if integration_time is not None:
+        clauses.append("integration_time = ?")
+        params.append(integration_time)
+    if start is not None:
+        clauses.append("utc >= ?")
+        params.append(start.timestamp())
+    if end is not None:
+        clauses.append("utc < ?")
+        params.append(end.timestamp())
+    if center_freq is not None:
+        clauses.append("center_freq BETWEEN ? AND ?")
+        params.extend(center_freq)
+    if date is not None:
+        clauses.append("date = ?")
+        params.append(date)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    with _catalog(catalog_path()) as conn:
+        query = f"SELECT * FROM spectra{where} ORDER BY utc"
+        return conn.execute(query, params).fetchall()
+
+
+def _file_stamp(path: str) -> tuple[int, int]:
+    # Stores are append-only, so any write changes their size even when it
+    # lands in the same mtime tick, which is coarse on FAT SD cards.
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=16)
+def _open_store(path: str, stamp: tuple[int, int]) -> SpectrumStore:
+    return SpectrumStore(path, mmap=True)
+
+
+@lru_cache(maxsize=LOAD_CACHE_SIZE)
+def _cached_spectrum(
+    path: str, stamp: tuple[int, int], observation_str: str, type_value: str
+):
+    """
+    Load a spectrum through a memory map, keyed on the file's modification
+    time and size so that a file written since is read afresh. Raises
+    KeyError if a store has no such spectrum, which lru_cache does not
+    remember, so a spectrum appended later is still found.
+    """
+    if path.endswith(STORE_NAME):
+        store = _open_store(path, stamp)
+        row = store.find(observation_str, type_value)
+        if row is None:
+            raise KeyError(f"{observation_str} has no {type_value} spectrum in {path}")
+        freqs, powers, _ = store.read(row)
+    else:
+        freqs, powers, _ = read_spectrum_file(path, mmap=True)
+    # Cached arrays are shared by every caller, so none may change them.
+    powers.setflags(write=False)
+    return freqs, powers
+
+
+def load_spectrum(date_str: str, observation_str: str, spectrum_type: SpectrumType):
+    """
+    Load one spectrum from the night's store, or from the .npy file that
+    older observations were saved as. Files are memory-mapped and the most
+    recently used spectra cached until their file changes, so the arrays
+    are read-only views shared between callers. The frequencies are a
+    shared array wherever they are evenly spaced.
+    Args:
+        date_str (str): The date in YYYYMMDD format.
+        observation_str (str): The observation identifier.
+        spectrum_type (SpectrumType): The type of spectrum.
+    Returns:
+        tuple: Frequencies and powers.
+    """
+    path = store_path(date_str)
+    if os.path.exists(path):
+        try:
+            return _cached_spectrum(
+                path, _file_stamp(path), observation_str, spectrum_type.value
+            )
+        except KeyError:
+            pass
+    path = os.path.join(
+        DATA_PATH, date_str, observation_str, spectrum_type.value + ".npy"
+    )
+    return _cached_spectrum(
+        path, _file_stamp(path), observation_str, spectrum_type.value
+    )
+
+
+class Observation:
+    """
+    The ON and OFF spectra of one observation, each loaded the first time
+    it is used.
+    """
+
+    def __init__(self, date_str: str, observation_str: str):
+        """
+        Args:
+            date_str (str): The date in YYYYMMDD format.
+            observation_str (str): The observation identifier.
+        """
+        self.date_str = date_str
+        self.observation_str = observation_str
+
+    @cached_property
+    def _on(self):
+        return load_spectrum(self.date_str, self.observation_str, SpectrumType.ON)
+
+    @property
+    def freqs(self) -> np.ndarray:
+        """Frequencies in Hz, shared with the ON and OFF spectra."""
+        return self._on[0]
+
+    @property
+    def on(self) -> np.ndarray:
+        """ON powers in dB."""
+        return self._on[1]
+
+    @cached_property
+    def off(self) -> np.ndarray:
+        """OFF powers in dB."""
+        return load_spectrum(self.date_str, self.observation_str, SpectrumType.OFF)[1]
+
+    @cached_property
+    def difference(self) -> np.ndarray:
+        """ON minus OFF powers in dB."""
+        return self.on - self.off
+
+
+def load_observation(date_str: str, observation_str: str) -> Observation:
+    """
+    Load an observation lazily: nothing is read until its freqs, on, off
+    or difference is used.
+    Args:
+        date_str (str): The date in YYYYMMDD format.
+        observation_str (str): The observation identifier.
+    Returns:
+        Observation: The observation.
+    """
+    return Observation(date_str, observation_str)
 
 
 def load_observation_dates() -> list[str]:
@@ -91,7 +635,12 @@ def load_observation_paths(date_str: str) -> list[str]:
     date_path = os.path.join(DATA_PATH, date_str)
     if not os.path.exists(date_path):
         return []
-    return sorted([f for f in os.listdir(date_path)])
+    observations = {
+        f for f in os.listdir(date_path) if os.path.isdir(os.path.join(date_path, f))
+    }
+    if os.path.exists(store_path(date_str)):
+        observations.update(SpectrumStore(store_path(date_str)).observations())
+    return sorted(observations)
 
 
 def load_on_off_spectrum(time_stamp: datetime, gain: int, integration_time: float):
@@ -104,11 +653,10 @@ def load_on_off_spectrum(time_stamp: datetime, gain: int, integration_time: floa
     Returns:
         tuple: Frequencies and the difference in powers between on and off observations.
     """
-    on_data = np.load(file_path(SpectrumType.ON, time_stamp, gain, integration_time))
-    off_data = np.load(file_path(SpectrumType.OFF, time_stamp, gain, integration_time))
-    on_freqs, on_powers = on_data[:, 0], on_data[:, 1]
-    off_powers = off_data[:, 1]
-    return on_freqs, on_powers - off_powers
+    return load_on_off_spectrum_from_observation(
+        time_stamp.strftime("%Y%m%d"),
+        os.path.basename(observation_path(time_stamp, gain, integration_time)),
+    )
 
 
 def load_on_off_spectrum_from_observation(
@@ -123,12 +671,8 @@ def load_on_off_spectrum_from_observation(
     Returns:
         tuple: Frequencies and the difference in powers between on and off observations.
     """
-    date_path = os.path.join(DATA_PATH, date_str, observation_str)
-    on_data = np.load(os.path.join(date_path, SpectrumType.ON.value + ".npy"))
-    off_data = np.load(os.path.join(date_path, SpectrumType.OFF.value + ".npy"))
-    on_freqs, on_powers = on_data[:, 0], on_data[:, 1]
-    off_powers = off_data[:, 1]
-    return on_freqs, on_powers - off_powers
+    observation = load_observation(date_str, observation_str)
+    return observation.freqs, observation.difference
 
 
 def load_on_and_off_spectrum_from_observation(
@@ -143,9 +687,5 @@ def load_on_and_off_spectrum_from_observation(
     Returns:
         tuple: Frequencies, on powers, and off powers.
     """
-    date_path = os.path.join(DATA_PATH, date_str, observation_str)
-    on_data = np.load(os.path.join(date_path, SpectrumType.ON.value + ".npy"))
-    off_data = np.load(os.path.join(date_path, SpectrumType.OFF.value + ".npy"))
-    on_freqs, on_powers = on_data[:, 0], on_data[:, 1]
-    off_powers = off_data[:, 1]
-    return on_freqs, on_powers, off_powers
+    observation = load_observation(date_str, observation_str)
+    return observation.freqs, observation.on, observation.off
@@ -0,0 +1,25 @@
+"""Conversion of raw RTL-SDR bytes to complex samples."""
+
+import numpy as np
+
+# The dongle delivers interleaved unsigned 8-bit I and Q. pyrtlsdr maps each
+# byte b to b / 127.5 - 1; precomputing that for all 256 values turns the
+# conversion into a single gather.
+IQ_LUT = (np.arange(256) / 127.5 - 1).astype(np.float32)
+
+
+def bytes_to_iq(raw, out: np.ndarray) -> np.ndarray:
+    """
+    Convert raw interleaved IQ bytes into an existing complex64 buffer.
+    Args:
+        raw: Any buffer of 2 * len(out) bytes, e.g. from RtlSdr.read_bytes.
+        out (np.ndarray): Contiguous complex64 buffer to fill.
+    Returns:
+        np.ndarray: out, for convenience.
+    """
+    data = np.frombuffer(raw, dtype=np.uint8)
+    if data.size != 2 * out.size:
+        raise ValueError(f"Expected {2 * out.size} bytes, got {data.size}.")
+    # mode="clip" lets take() write straight into out; every index is in range.
+    np.take(IQ_LUT, data, out=out.view(np.float32), mode="clip")
+    return out
@@ -0,0 +1,151 @@
+"""Raw IQ recordings, kept so spectra can be recomputed later.
+
+A recording is two files: <name>.iq holding the dongle's interleaved
+unsigned 8-bit I and Q exactly as read, and <name>.json holding what is
+needed to interpret it. The samples are written through a memory map sized
+up front and read back through one, chunk by chunk, so neither side ever
+holds a whole recording in RAM: 180 s at 2.048 MS/s is about 740 MB.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .iq import bytes_to_iq
+from .spectrum import SpectrumEngine
+
+IQ_EXTENSION = ".iq"
+METADATA_EXTENSION = ".json"
+
+
+def _paths(path: str) -> tuple[str, str]:
+    base = path[: -len(IQ_EXTENSION)] if path.endswith(IQ_EXTENSION) else path
+    return base + IQ_EXTENSION, base + METADATA_EXTENSION
+
+
+class IQRecorder:
+    """Streams raw IQ bytes into a preallocated memory-mapped file."""
+
+    def __init__(
+        self,
+        path: str,
+        n_samples: int,
+        sample_rate: float,
+        center_freq: float,
+        gain: float,
+        start: datetime | None = None,
+    ):
+        """
+        Create the recording and its metadata sidecar.
+        Args:
+            path (str): Recording path, with or without the .iq extension.
+            n_samples (int): Number of samples to record; bytes past this are
+                ignored.
+            sample_rate (float): Sample rate in Hz.
+            center_freq (float): Center frequency in Hz.
+            gain (float): Gain in dB.
+            start (datetime): UTC time of the first sample, default now.
+        """
+        self.iq_path, self.metadata_path = _paths(path)
+        os.makedirs(os.path.dirname(self.iq_path) or ".", exist_ok=True)
+        self._map = np.memmap(self.iq_path, dtype=np.uint8, mode="w+", shape=(2 * n_samples,))
+        self._written = 0
+        self.metadata = {
+            "format": "interleaved uint8 IQ",
+            "center_freq": center_freq,
+            "sample_rate": sample_rate,
+            "gain": gain,
+            "utc_start": (start or datetime.now(timezone.utc)).isoformat(),
+            "samples": 0,
+        }
+        self._write_metadata()
+
+    def _write_metadata(self):
+        with open(self.metadata_path, "w") as f:
+            json.dump(self.metadata, f, indent=2)
+
+    @property
+    def full(self) -> bool:
+        return self._written == self._map.size
+
+    def write(self, raw):
+        """
+        Append raw bytes, as returned by RtlSdr.read_bytes.
+        Args:
+            raw: Buffer of interleaved IQ bytes.
+        """
+        data = np.frombuffer(raw, dtype=np.uint8)
+        n = min(data.size, self._map.size - self._written)
+        self._map[self._written : self._written + n] = data[:n]
+        self._written += n
+
+    def close(self):
+        """
+        Flush the samples to disk and record how many were written. A short
+        recording is truncated to what was actually captured.
+        """
+        if self._map is None:
+            return
+        self._map.flush()
+        size = self._map.size
+        del self._map
+        self._map = None
+        if self._written < size:
+            os.truncate(self.iq_path, self._written)
+        self.metadata["samples"] = self._written // 2
+        self._write_metadata()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_recording_metadata(path: str) -> dict:
+    """
+    Load a recording's metadata sidecar.
+    Args:
+        path (str): Recording path, with or without the .iq extension.
+    Returns:
+        dict: center_freq (Hz), sample_rate (Hz), gain (dB), utc_start and samples.
+    """
+    with open(_paths(path)[1]) as f:
+        return json.load(f)
+
+
+def reprocess_recording(
+    path: str,
+    bin_size: int = 1024,
+    window: str = "boxcar",
+    chunk_samples: int = 1 << 20,
+):
+    """
+    Compute the integrated spectrum of a recording at any bin size.
+    Args:
+        path (str): Recording path, with or without the .iq extension.
+        bin_size (int): Number of frequency bins.
+        window (str): FFT window.
+        chunk_samples (int): Samples converted at a time; bounds memory use.
+    Returns:
+        freqs: float[] Frequencies in Hz.
+        powers: float[] Powers in dB.
+    """
+    metadata = load_recording_metadata(path)
+    raw = np.memmap(_paths(path)[0], dtype=np.uint8, mode="r")
+    chunk_samples = max(bin_size, chunk_samples // bin_size * bin_size)
+    engine = SpectrumEngine(
+        bin_size,
+        metadata["sample_rate"],
+        metadata["center_freq"],
+        chunk_samples,
+        window=window,
+    )
+    buffer = np.empty(chunk_samples, dtype=np.complex64)
+    n_samples = raw.size // 2
+    for start in range(0, n_samples, chunk_samples):
+        n = min(chunk_samples, n_samples - start)
+        engine.accumulate(bytes_to_iq(raw[2 * start : 2 * (start + n)], buffer[:n]))
+    return engine.spectrum()
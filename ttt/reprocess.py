@@ -0,0 +1,232 @@
+"""Bulk reprocessing of the archive into PROCESSED spectra.
+
+Every observation with both an ON and an OFF spectrum gets a PROCESSED
+spectrum, ON minus OFF in dB, the same difference the load_on_off_*
+functions compute, saved once so later analysis can read it directly.
+
+Observations are processed in a pool of worker processes. A manifest per
+date records what each PROCESSED spectrum was made from, so a rerun skips
+observations whose inputs are unchanged: when the input file's mtime and
+size match nothing is read at all, and when they differ (a night store
+changes with every append) the inputs are hashed and compared.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import file_io
+from .utils import SpectrumType
+
+MANIFEST_NAME = "processed_manifest.json"  # one per date directory
+
+
+def _manifest_path(date_str: str) -> str:
+    return os.path.join(file_io.DATA_PATH, date_str, MANIFEST_NAME)
+
+
+def _load_manifest(date_str: str) -> dict:
+    path = _manifest_path(date_str)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(date_str: str, manifest: dict):
+    path = _manifest_path(date_str)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _input_files(date_str: str, observation_str: str) -> list[str]:
+    """
+    Files an observation's ON and OFF spectra may be read from.
+    """
+    paths = [file_io.store_path(date_str)]
+    for spectrum_type in (SpectrumType.ON, SpectrumType.OFF):
+        paths.append(
+            os.path.join(
+                file_io.DATA_PATH,
+                date_str,
+                observation_str,
+                spectrum_type.value + ".npy",
+            )
+        )
+    return [p for p in paths if os.path.exists(p)]
+
+
+def _file_stamp(paths: list[str]) -> list:
+    return [[p, os.stat(p).st_mtime_ns, os.stat(p).st_size] for p in paths]
+
+
+def _init_worker(data_path: str):
+    file_io.DATA_PATH = data_path
+
+
+def _process_observation(task):
+    """
+    Compute one observation's PROCESSED spectrum in a worker process.
+    Args:
+        task (tuple): date_str, observation_str, and the input hash recorded
+            in the manifest or None.
+    Returns:
+        tuple: (date_str, observation_str, status, input_hash, freqs,
+        powers, metadata), where status is "processed", "unchanged" or an
+        error message, and the rest are None unless processed. metadata is
+        the ON spectrum's (utc, pointing), which PROCESSED inherits.
+    """
+    date_str, observation_str, known_hash = task
+    try:
+        observation = file_io.load_observation(date_str, observation_str)
+        if not np.array_equal(
+            observation.freqs,
+            file_io.load_spectrum(date_str, observation_str, SpectrumType.OFF)[0],
+        ):
+            raise ValueError("ON and OFF frequencies differ")
+        digest = hashlib.sha1()
+        for array in (observation.freqs, observation.on, observation.off):
+            digest.update(np.ascontiguousarray(array, dtype="<f8").tobytes())
+        input_hash = digest.hexdigest()
+        if input_hash == known_hash:
+            return date_str, observation_str, "unchanged", input_hash, None, None, None
+        return (
+            date_str,
+            observation_str,
+            "processed",
+            input_hash,
+            np.array(observation.freqs),
+            np.array(observation.difference),
+            file_io.observation_metadata(date_str, observation_str, SpectrumType.ON),
+        )
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        return date_str, observation_str, error, None, None, None, None
+
+
+def _observations_with_on_and_off(date_str: str) -> list[str]:
+    """
+    Observations of a date that have both an ON and an OFF spectrum.
+    """
+    have = set()
+    path = file_io.store_path(date_str)
+    if os.path.exists(path):
+        rows = file_io.SpectrumStore(path).rows
+        have.update(
+            (o.decode(), t.decode()) for o, t in zip(rows["observation"], rows["type"])
+        )
+
+    def has(observation_str, spectrum_type):
+        if (observation_str, spectrum_type.value) in have:
+            return True
+        return os.path.exists(
+            os.path.join(
+                file_io.DATA_PATH,
+                date_str,
+                observation_str,
+                spectrum_type.value + ".npy",
+            )
+        )
+
+    return [
+        observation_str
+        for observation_str in file_io.load_observation_paths(date_str)
+        if has(observation_str, SpectrumType.ON)
+        and has(observation_str, SpectrumType.OFF)
+    ]
+
+
+def reprocess_archive(
+    workers: int | None = None, force: bool = False, chunksize: int = 8
+) -> dict:
+    """
+    Compute PROCESSED spectra for every observation under DATA_PATH whose
+    inputs changed since it was last processed.
+    Args:
+        workers (int): Worker processes; defaults to one per CPU.
+        force (bool): Reprocess everything, ignoring the manifests.
+        chunksize (int): Observations handed to a worker at a time.
+    Returns:
+        dict: Number of observations "processed", "unchanged" and "failed".
+    """
+    manifests = {}
+    stamps = {}
+    tasks = []
+    counts = {"processed": 0, "unchanged": 0, "failed": 0}
+    saved_dates = set()
+    for date_str in file_io.load_observation_dates():
+        manifest = {} if force else _load_manifest(date_str)
+        manifests[date_str] = manifest
+        for observation_str in _observations_with_on_and_off(date_str):
+            stamp = _file_stamp(_input_files(date_str, observation_str))
+            stamps[date_str, observation_str] = stamp
+            entry = manifest.get(observation_str)
+            if entry is not None and entry["files"] == stamp:
+                counts["unchanged"] += 1
+                continue
+            known_hash = None if entry is None else entry["hash"]
+            tasks.append((date_str, observation_str, known_hash))
+
+    print(f"Reprocessing {len(tasks)} observations, {counts['unchanged']} unchanged.")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(file_io.DATA_PATH,),
+    ) as executor:
+        for (
+            date_str,
+            observation_str,
+            status,
+            input_hash,
+            freqs,
+            powers,
+            metadata,
+        ) in executor.map(_process_observation, tasks, chunksize=chunksize):
+            if input_hash is None:
+                counts["failed"] += 1
+                print(f"Failed to process {date_str}/{observation_str}: {status}")
+                continue
+            counts[status] += 1
+            if status == "processed":
+                # Saved here rather than in the workers, so that only one
+                # process appends to a night's store. Dated and pointed as
+                # the ON spectrum, so catalog queries find it with it.
+                utc, pointing = metadata
+                file_io.save_spectrum(
+                    freqs,
+                    powers,
+                    os.path.join(
+                        file_io.DATA_PATH,
+                        date_str,
+                        observation_str,
+                        SpectrumType.PROCESSED.value + ".npy",
+                    ),
+                    pointing=pointing,
+                    utc=utc,
+                )
+                saved_dates.add(date_str)
+            manifests[date_str][observation_str] = {
+                "files": stamps[date_str, observation_str],
+                "hash": input_hash,
+            }
+
+    for date_str, manifest in manifests.items():
+        if date_str in saved_dates:
+            # Saving PROCESSED rows changed the night store's mtime, so
+            # restamp the observations checked in this run.
+            for observation_str, entry in manifest.items():
+                if (date_str, observation_str) in stamps:
+                    entry["files"] = _file_stamp(
+                        _input_files(date_str, observation_str)
+                    )
+        if manifest:
+            _save_manifest(date_str, manifest)
+    print(
+        f"Processed {counts['processed']}, unchanged {counts['unchanged']}, "
+        f"failed {counts['failed']}."
+    )
+    return counts
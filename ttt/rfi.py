@@ -0,0 +1,187 @@
+"""RFI excision applied while integrating.
+
+An exposure is split into short sub-integrations. Each is checked twice:
+
+  * Spectral kurtosis per channel. For M periodograms of Gaussian noise,
+    SK = (M + 1) / (M - 1) * (M * S2 / S1**2 - 1) is 1 with a standard
+    deviation of about 2 / sqrt(M); tones and bursts push it away from 1.
+    Channels outside the threshold are left out of that sub-integration.
+  * Median absolute deviation of the sub-integration's total power against
+    the recent ones. A broadband burst that lifts every channel at once, and
+    so barely moves SK, drops the whole sub-integration instead.
+
+Everything is a handful of vectorised operations per sub-integration on
+bin_size arrays; the only per-block cost is the squared-power sum the
+SpectrumEngine keeps when created with kurtosis=True.
+"""
+
+from collections import deque
+
+import numpy as np
+
+# Scales a MAD to the standard deviation it estimates for Gaussian data.
+MAD_TO_SIGMA = 1.4826
+
+
+class RFIFlagger:
+    """Accumulates sub-integrations into an average with RFI left out."""
+
+    def __init__(
+        self,
+        bin_size: int,
+        sk_threshold: float = 5.0,
+        mad_threshold: float = 5.0,
+        drop_fraction: float = 0.2,
+        mask_fraction: float = 0.5,
+        history: int = 32,
+    ):
+        """
+        Args:
+            bin_size (int): Number of frequency bins.
+            sk_threshold (float): Flag a channel when its spectral kurtosis is
+                this many standard deviations from 1.
+            mad_threshold (float): Drop a sub-integration when its total power
+                is this many robust standard deviations above recent ones.
+            drop_fraction (float): Also drop a sub-integration when more than
+                this fraction of its channels are flagged.
+            mask_fraction (float): Report a channel in the final mask when it
+                was flagged in more than this fraction of sub-integrations.
+            history (int): Number of recent sub-integration powers the MAD
+                test compares against. A rise in power that lasts longer
+                than about half of them is accepted as the new level.
+        """
+        self.sk_threshold = sk_threshold
+        self.mad_threshold = mad_threshold
+        self.drop_fraction = drop_fraction
+        self.mask_fraction = mask_fraction
+        self._sum = np.zeros(bin_size)
+        self._counts = np.zeros(bin_size)
+        self._flagged = np.zeros(bin_size)
+        self._recent = deque(maxlen=history)
+        self.sub_integrations = 0
+        self.dropped = 0
+
+    def reset(self):
+        """
+        Discard everything accumulated so far.
+        """
+        self._sum[:] = 0
+        self._counts[:] = 0
+        self._flagged[:] = 0
+        self._recent.clear()
+        self.sub_integrations = 0
+        self.dropped = 0
+
+    def add(self, total: np.ndarray, total_sq: np.ndarray, count: int):
+        """
+        Check one sub-integration and add its clean channels to the average.
+        Args:
+            total (np.ndarray): Sum of the sub-integration's periodograms.
+            total_sq (np.ndarray): Sum of their squares.
+            count (int): Number of periodograms summed, M.
+        """
+        if count < 2:
+            return
+        self.sub_integrations += 1
+
+        power = float(total.sum()) / count
+        recent = np.fromiter(self._recent, dtype=float)
+        # Every power joins the history, dropped or not, so the reference
+        # follows a lasting change such as gain drift and only excursions
+        # shorter than about half the history are dropped.
+        self._recent.append(power)
+        if recent.size >= 4:
+            median = np.median(recent)
+            mad = MAD_TO_SIGMA * np.median(np.abs(recent - median))
+            if mad > 0 and power - median > self.mad_threshold * mad:
+                self.dropped += 1
+                self._flagged += 1
+                return
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sk = (count + 1) / (count - 1) * (count * total_sq / total**2 - 1)
+        bad = ~(np.abs(sk - 1) <= self.sk_threshold * 2 / np.sqrt(count))
+        if bad.mean() > self.drop_fraction:
+            self.dropped += 1
+            self._flagged += 1
+            return
+
+        good = ~bad
+        self._sum[good] += total[good]
+        self._counts[good] += count
+        self._flagged[bad] += 1
+
+    def psd(self, scale: float) -> np.ndarray:
+        """
+        The averaged power spectral density of the clean data, in FFT order.
+        Channels flagged in every sub-integration are NaN.
+        Args:
+            scale (float): The SpectrumEngine's density scale.
+        Returns:
+            np.ndarray: Linear power spectral density.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self._counts > 0, self._sum * scale / self._counts, np.nan)
+
+    def mask(self) -> np.ndarray:
+        """
+        Channels to treat as RFI in the final spectrum, in FFT order.
+        Returns:
+            np.ndarray: Boolean mask, True where flagged.
+        """
+        if self.sub_integrations == 0:
+            return np.zeros(self._sum.shape, dtype=bool)
+        return (self._counts == 0) | (
+            self._flagged > self.mask_fraction * self.sub_integrations
+        )
+
+
+class FlaggedIntegration:
+    """
+    Drives a SpectrumEngine in sub-integrations through an RFIFlagger, with
+    the same accumulate()/spectrum() interface as the engine itself.
+    """
+
+    def __init__(self, engine, flagger: RFIFlagger, blocks_per_sub: int):
+        """
+        Args:
+            engine (SpectrumEngine): Engine created with kurtosis=True.
+            flagger (RFIFlagger): Receives each sub-integration.
+            blocks_per_sub (int): Blocks per sub-integration.
+        """
+        self.engine = engine
+        self.flagger = flagger
+        self.blocks_per_sub = blocks_per_sub
+        self._blocks = 0
+
+    def reset(self):
+        self.engine.reset()
+        self.flagger.reset()
+        self._blocks = 0
+
+    def _flush(self):
+        if self.engine.count:
+            total, count = self.engine.partial()
+            self.flagger.add(total, self.engine.partial_sq(), count)
+            self.engine.reset()
+        self._blocks = 0
+
+    def accumulate(self, samples: np.ndarray):
+        self.engine.accumulate(samples)
+        self._blocks += 1
+        if self._blocks == self.blocks_per_sub:
+            self._flush()
+
+    def spectrum(self):
+        """
+        The RFI-excised average, in the form take_exposure returns.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB, NaN where no clean data remained.
+            flags: bool[] True for channels flagged as RFI.
+        """
+        self._flush()
+        psd = np.fft.fftshift(self.flagger.psd(self.engine.scale))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            powers = 10 * np.log10(psd)
+        return self.engine.freqs, powers, np.fft.fftshift(self.flagger.mask())
@@ -1,8 +1,50 @@
+import os
+import time
+from contextlib import nullcontext
 from datetime import datetime, timedelta, timezone
+from typing import Callable, NamedTuple
 
+import numpy as np
 from rtlobs import collect
 
+from .iq import bytes_to_iq
+from .recording import IQRecorder
+from .rfi import FlaggedIntegration, RFIFlagger
+from .spectrum import LINE_HALF_WIDTH, SpectrumEngine, line_snr, stitch_spectra
+from .stream import IQRing, StreamingCapture
+from .timing import ExposureReport, StageTimer
 from .utils import H1_LINE
+from .workers import SpectralWorkerPool
+
+
+ENGINES = ("rtlobs", "native")
+
+
+class ExposureUpdate(NamedTuple):
+    """A running-average spectrum yielded part way through an exposure."""
+
+    freqs: np.ndarray  # Hz
+    powers: np.ndarray  # dB
+    elapsed: float  # seconds of samples integrated so far
+    noise: float  # dB RMS of the baseline residual
+    snr: float  # H I line peak over noise
+    dropped: int  # blocks dropped so far
+
+
+class GainMeasurement(NamedTuple):
+    """ADC health at one gain setting, from a short capture."""
+
+    gain: float  # dB
+    clip_fraction: float  # share of I and Q bytes at 0 or 255
+    rms_counts: float  # RMS of I and Q in ADC counts
+    flatness: float  # spectral flatness, 1 for white noise, ~0 for tones
+
+
+class GainCalibration(NamedTuple):
+    """The outcome of RTLSDR.calibrate_gain."""
+
+    gain: float  # dB, the gain chosen and set
+    measurements: list[GainMeasurement]  # every gain tried, ascending
 
 
 class RTLSDR:
@@ -15,6 +57,17 @@ class RTLSDR:
         sample_rate: float = 2.048e6,
         center_freq: float = H1_LINE,
         integration_time: int = 1,
+        streaming: bool = False,
+        ring_size: int = 64,
+        engine: str = "rtlobs",
+        window: str = "boxcar",
+        fft_dtype=np.complex64,
+        workers: int = 0,
+        device: Callable | None = None,
+        profile: bool = False,
+        auto_gain: bool = False,
+        rfi_flagging: bool = False,
+        rfi_interval: float = 0.5,
     ):
         """
         Initialize the RTLSDR parameters.
@@ -25,7 +78,35 @@ class RTLSDR:
             sample_rate (float): Sample rate in Hz.
             center_freq (float): Center frequency in MHz.
             integration_time (int): Integration time in seconds.
+            streaming (bool): Overlap USB reads with spectrum processing using
+                a reader thread instead of rtlobs' read-then-process loop.
+            ring_size (int): Number of sample_size buffers the reader thread
+                can run ahead of processing when streaming.
+            engine (str): "rtlobs" to integrate with rtlobs.collect, or
+                "native" to use the batched FFT engine in ttt.spectrum.
+                Streaming always uses the native engine.
+            window (str): FFT window for the native engine.
+            fft_dtype: FFT working precision for the native engine,
+                complex64 or complex128.
+            workers (int): If non-zero, FFT in this many worker processes fed
+                from a shared-memory IQ ring. Overrides streaming and engine.
+            device (callable): Opens the SDR as device(sample_rate, center_freq,
+                gain), with center_freq in Hz. Defaults to rtlobs'
+                collect.get_sdr; pass ttt.simulate.SimulatedSDR to run
+                without hardware.
+            profile (bool): Time each stage of every exposure; see timer and
+                last_report.
+            auto_gain (bool): Run calibrate_gain as soon as the device opens,
+                replacing gain with the one it picks.
+            rfi_flagging (bool): Excise RFI while integrating (see ttt.rfi);
+                the flagged channels of the last exposure are in flags.
+                Needs the native engine or streaming, not workers.
+            rfi_interval (float): Seconds per sub-integration when flagging.
         """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown spectrum engine {engine!r}, expected one of {ENGINES}.")
+        if rfi_flagging and (workers or not (streaming or engine == "native")):
+            raise ValueError("RFI flagging needs the native engine or streaming, without workers.")
         # initialize the parameters for the RTL-SDR
         self._sample_size = sample_size
         self._bin_size = bin_size
@@ -33,6 +114,26 @@ class RTLSDR:
         self._sample_rate = sample_rate
         self._center_freq = center_freq
         self._integration_time = integration_time
+        self._streaming = streaming
+        self._ring_size = ring_size
+        self._ring = None
+        self._block = None
+        self._engine_name = engine
+        self._window = window
+        self._fft_dtype = fft_dtype
+        self._engine = None
+        self._workers = workers
+        self._pool = None
+        self._open_device = device or collect.get_sdr
+        self.dropped_blocks = 0
+        self.timer = StageTimer() if profile else None
+        self._auto_gain = auto_gain
+        self._recorder = None
+        self._rfi_flagging = rfi_flagging
+        self._rfi_interval = rfi_interval
+        self._flagger = None
+        self.flags = None
+        self.calibration = None
         self.sdr = None
 
     def __enter__(self):
@@ -41,10 +142,17 @@ class RTLSDR:
         Returns:
             self: The instance of RTLSDR.
         """
-        self.sdr = collect.get_sdr(self._sample_rate, self.get_center_freq, self._gain)
+        with self.stage("open"):
+            self.sdr = self._open_device(
+                self._sample_rate, self.get_center_freq, self._gain
+            )
         try:
             self.bias_tee_on()
+            self.start_workers()
+            if self._auto_gain:
+                self.calibration = self.calibrate_gain()
         except Exception:
+            self.bias_tee_off()
             self.disconnect()
             raise
         return self
@@ -59,6 +167,7 @@ class RTLSDR:
         """
         self.bias_tee_off()
         self.disconnect()
+        self.close_workers()
 
     @property
     def get_center_freq(self):
@@ -89,6 +198,25 @@ class RTLSDR:
         self.sdr.set_gain(gain)
         print(f"Gain set to {gain} dB")
 
+    def set_center_freq(self, center_freq: float):
+        """
+        Retune the RTL-SDR for the following exposures.
+        Args:
+            center_freq (float): Center frequency in MHz.
+        """
+        self._center_freq = center_freq
+        if self.sdr is not None:
+            self.sdr.set_center_freq(self.get_center_freq)
+        print(f"Center frequency set to {center_freq} MHz")
+
+    def set_integration_time(self, integration_time: float):
+        """
+        Set the integration time of the following exposures.
+        Args:
+            integration_time (float): Integration time in seconds.
+        """
+        self._integration_time = integration_time
+
     def bias_tee_on(self):
         """
         Turn on the bias tee to power the LNA.
@@ -96,7 +224,8 @@ class RTLSDR:
         if self.sdr is None:
             raise RuntimeError("RTL-SDR is not connected. Cannot turn on bias tee.")
 
-        self.sdr.set_bias_tee(True)
+        with self.stage("bias_tee"):
+            self.sdr.set_bias_tee(True)
         print("Bias Tee turned on.")
 
     def bias_tee_off(self):
@@ -106,12 +235,139 @@ class RTLSDR:
         if self.sdr is None:
             return
 
-        self.sdr.set_bias_tee(False)
+        with self.stage("bias_tee"):
+            self.sdr.set_bias_tee(False)
         print("Bias Tee turned off.")
 
-    def take_exposure(self):
+    def measure_gain(
+        self, gain: float, capture_time: float = 0.2, settle: float = 0.05
+    ) -> GainMeasurement:
+        """
+        Set a gain and measure clipping and spectral flatness on a short capture.
+        Args:
+            gain (float): Gain in dB.
+            capture_time (float): Seconds of samples to measure.
+            settle (float): Seconds of samples discarded after the gain change.
+        Returns:
+            GainMeasurement: The measurements.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot measure gain.")
+        self.sdr.set_gain(gain)
+        self._gain = gain
+        settle_bytes = 2 * int(settle * self._sample_rate)
+        if settle_bytes:
+            self.sdr.read_bytes(settle_bytes)
+
+        engine = self._spectrum_engine()
+        if self._block is None:
+            self._block = np.empty(self._sample_size, dtype=np.complex64)
+        n_blocks = max(1, round(capture_time * self._sample_rate / self._sample_size))
+        clipped = 0
+        square_sum = 0.0
+        for _ in range(n_blocks):
+            raw = np.frombuffer(
+                self.sdr.read_bytes(2 * self._sample_size), dtype=np.uint8
+            )
+            clipped += np.count_nonzero((raw == 0) | (raw == 255))
+            engine.accumulate(bytes_to_iq(raw, self._block))
+            square_sum += float(np.vdot(self._block, self._block).real)
+        n_values = 2 * n_blocks * self._sample_size
+
+        psd = engine.psd()
+        flatness = float(np.exp(np.mean(np.log(psd))) / np.mean(psd))
+        return GainMeasurement(
+            gain,
+            float(clipped / n_values),
+            # Samples are scaled so one ADC count is 1 / 127.5.
+            127.5 * float(np.sqrt(square_sum / n_values)),
+            flatness,
+        )
+
+    def calibrate_gain(
+        self,
+        max_clip: float = 1e-3,
+        min_flatness: float | None = None,
+        capture_time: float = 0.2,
+    ) -> GainCalibration:
+        """
+        Find the highest gain at which the ADC does not clip, by bisection
+        over the tuner's gain table. Clipping only
+        grows with gain, so about five short captures cover the whole table.
+        Sets the chosen gain before returning.
+        Args:
+            max_clip (float): Largest acceptable fraction of clipped bytes.
+            min_flatness (float): If given, also reject gains whose spectral
+                flatness falls below this. Intermodulation at high gain pulls
+                it down, but so does any steady RFI tone at every gain, so it
+                is off by default and only reported.
+            capture_time (float): Seconds of samples measured per gain.
+        Returns:
+            GainCalibration: The chosen gain and every measurement taken.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot calibrate gain.")
+        gains = sorted(self.sdr.valid_gains_db)
+        measured = {}
+
+        def acceptable(index):
+            if index not in measured:
+                measured[index] = self.measure_gain(gains[index], capture_time)
+            m = measured[index]
+            if min_flatness is not None and m.flatness < min_flatness:
+                return False
+            return m.clip_fraction <= max_clip
+
+        if not acceptable(0):
+            chosen = 0
+            print("Even the lowest gain is unacceptable; check for strong RFI.")
+        elif acceptable(len(gains) - 1):
+            chosen = len(gains) - 1
+        else:
+            # Invariant: gains[low] is acceptable, gains[high] is not.
+            low, high = 0, len(gains) - 1
+            while high - low > 1:
+                middle = (low + high) // 2
+                if acceptable(middle):
+                    low = middle
+                else:
+                    high = middle
+            chosen = low
+
+        self.set_gain(gains[chosen])
+        return GainCalibration(
+            gains[chosen], [measured[i] for i in sorted(measured)]
+        )
+
+    def stage(self, name: str):
+        """
+        Time a with-block as a stage of the current exposure when profiling,
+        e.g. saving its result. Does nothing otherwise.
+        Args:
+            name (str): Stage name, such as "save".
+        Returns:
+            A context manager.
+        """
+        if self.timer is None:
+            return nullcontext()
+        return self.timer.stage(name)
+
+    @property
+    def last_report(self) -> ExposureReport | None:
+        """
+        Stage timings of the most recent exposure, when profiling.
+        Returns:
+            ExposureReport: The report, or None if not profiling.
+        """
+        return None if self.timer is None else self.timer.current
+
+    def take_exposure(self, record_to: str | None = None):
         """
         Take an exposure with the RTL-SDR.
+        Args:
+            record_to (str): If given, also record the raw IQ of the exposure
+                to this path (see ttt.recording). Needs the native engine,
+                streaming or workers.
         Returns:
             freqs: float[] Frequencies in MHz.
             powers: float[] Powers in dB.
@@ -119,23 +375,566 @@ class RTLSDR:
         """
 
         start_time = datetime.now(timezone.utc)
+        self.dropped_blocks = 0
+        self.flags = None
+        if self.timer is not None:
+            self.timer.begin()
 
         try:
-            freqs, powers = collect.run_spectrum_int(
-                self._sample_size,
-                self._bin_size,
-                self._gain,
-                self._sample_rate,
-                self.get_center_freq,
-                self._integration_time,
-                self.sdr,
-            )
+            if record_to is not None:
+                if self._engine_name == "rtlobs" and not (self._workers or self._streaming):
+                    raise ValueError("Recording raw IQ needs the native engine.")
+                self._recorder = IQRecorder(
+                    record_to,
+                    self._n_blocks * self._sample_size,
+                    self._sample_rate,
+                    self.get_center_freq,
+                    self._gain,
+                    start_time,
+                )
+            if self._workers:
+                freqs, powers = self._pooled_spectrum_int()
+            elif self._streaming:
+                freqs, powers = self._streaming_spectrum_int()
+            elif self._engine_name == "native":
+                freqs, powers = self._native_spectrum_int()
+            else:
+                with self.stage("rtlobs"):
+                    freqs, powers = collect.run_spectrum_int(
+                        self._sample_size,
+                        self._bin_size,
+                        self._gain,
+                        self._sample_rate,
+                        self.get_center_freq,
+                        self._integration_time,
+                        self.sdr,
+                    )
             end_time = datetime.now(timezone.utc)
             return freqs, powers, end_time - start_time - timedelta(seconds=self._integration_time)
         except Exception as e:
             end_time = datetime.now(timezone.utc)
             print(f"Error taking exposure: {e}")
             return None, None, end_time - start_time - timedelta(seconds=self._integration_time)
+        finally:
+            if self._recorder is not None:
+                self._recorder.close()
+                self._recorder = None
+            if self.timer is not None:
+                self.timer.end(self.dropped_blocks)
+
+    @property
+    def _n_blocks(self) -> int:
+        return max(
+            1, round(self._integration_time * self._sample_rate / self._sample_size)
+        )
+
+    def _spectrum_engine(self) -> SpectrumEngine:
+        """
+        Get the native spectrum engine, reset and tuned to the current settings.
+        Returns:
+            SpectrumEngine: The engine, reused between exposures.
+        """
+        if self._engine is None:
+            self._engine = SpectrumEngine(
+                self._bin_size,
+                self._sample_rate,
+                self.get_center_freq,
+                self._sample_size,
+                window=self._window,
+                dtype=self._fft_dtype,
+                kurtosis=self._rfi_flagging,
+            )
+        self._engine.center_freq = self.get_center_freq
+        self._engine.timer = self.timer
+        self._engine.reset()
+        return self._engine
+
+    def _integrator(self):
+        """
+        Get what the native and streaming paths accumulate blocks into: the
+        spectrum engine itself, or the engine wrapped in RFI flagging.
+        Returns:
+            SpectrumEngine or FlaggedIntegration: Reset and ready.
+        """
+        engine = self._spectrum_engine()
+        if not self._rfi_flagging:
+            return engine
+        if self._flagger is None:
+            self._flagger = RFIFlagger(self._bin_size)
+        blocks_per_sub = max(
+            1, round(self._rfi_interval * self._sample_rate / self._sample_size)
+        )
+        integration = FlaggedIntegration(engine, self._flagger, blocks_per_sub)
+        integration.reset()
+        return integration
+
+    def _finish(self, integrator):
+        """
+        Turn a finished integrator into freqs and powers, keeping any flags.
+        """
+        if isinstance(integrator, FlaggedIntegration):
+            freqs, powers, self.flags = integrator.spectrum()
+            print(
+                f"RFI: {self.flags.sum()} channels flagged, "
+                f"{integrator.flagger.dropped} of "
+                f"{integrator.flagger.sub_integrations} sub-integrations dropped."
+            )
+            return freqs, powers
+        return integrator.spectrum()
+
+    def _read_into(self, buffer: np.ndarray):
+        """
+        Fill buffer with the next len(buffer) samples from the dongle.
+        Reads raw bytes and converts them in place, so unlike read_samples
+        nothing the size of the block is allocated.
+        Args:
+            buffer (np.ndarray): Contiguous complex64 buffer to overwrite.
+        """
+        if self.timer is None:
+            raw = self.sdr.read_bytes(2 * len(buffer))
+            if self._recorder is not None:
+                self._recorder.write(raw)
+            bytes_to_iq(raw, buffer)
+            return
+        started = time.perf_counter()
+        raw = self.sdr.read_bytes(2 * len(buffer))
+        read = time.perf_counter()
+        if self._recorder is not None:
+            self._recorder.write(raw)
+        bytes_to_iq(raw, buffer)
+        self.timer.add("read", read - started)
+        self.timer.add("convert", time.perf_counter() - read)
+        # A read normally blocks for about one block's worth of samples.
+        if read - started > 2 * len(buffer) / self._sample_rate:
+            self.timer.late()
+
+    def _native_spectrum_int(self):
+        """
+        Integrate a spectrum with the native engine, reading and processing
+        one block at a time.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot take exposure.")
+        integrator = self._integrator()
+        if self._block is None:
+            self._block = np.empty(self._sample_size, dtype=np.complex64)
+        for _ in range(self._n_blocks):
+            self._read_into(self._block)
+            integrator.accumulate(self._block)
+        return self._finish(integrator)
+
+    def _streaming_spectrum_int(self):
+        """
+        Integrate a spectrum with USB reads running in a separate thread.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot take exposure.")
+        if self._ring is None:
+            self._ring = IQRing(self._ring_size, self._sample_size)
+        integrator = self._integrator()
+
+        capture = StreamingCapture(self._ring, self._read_into, integrator.accumulate)
+        self.dropped_blocks = capture.run(self._n_blocks)
+        if self.dropped_blocks:
+            print(
+                f"Processing fell behind: {self.dropped_blocks} of "
+                f"{capture.blocks_read} blocks dropped."
+            )
+        return self._finish(integrator)
+
+    def _pooled_spectrum_int(self):
+        """
+        Integrate a spectrum with the FFTs spread over worker processes.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot take exposure.")
+        self.start_workers()
+        engine = self._spectrum_engine()
+        try:
+            self.dropped_blocks = self._pool.integrate(
+                self._read_into, self._n_blocks, engine
+            )
+        except Exception:
+            # Workers may still hold part of this exposure; start clean next time.
+            self.close_workers()
+            raise
+        if self.dropped_blocks:
+            print(f"Workers fell behind: {self.dropped_blocks} blocks dropped.")
+        return engine.spectrum()
+
+    def start_workers(self):
+        """
+        Start the spectrum worker processes, if configured and not yet running.
+        """
+        if self._workers and self._pool is None:
+            self._pool = SpectralWorkerPool(
+                self._workers,
+                self._sample_size,
+                self._bin_size,
+                self._sample_rate,
+                window=self._window,
+                dtype=self._fft_dtype,
+            )
+
+    def close_workers(self):
+        """
+        Stop the spectrum worker processes, if any were started.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def sweep(
+        self,
+        center_freqs: list[float],
+        dwell: float | None = None,
+        settle: float = 0.02,
+        trim: float = 0.1,
+    ):
+        """
+        Step across several overlapping center frequencies and stitch the
+        spectra into one. Each step's blocks are integrated as the reader
+        thread delivers them, as in a streaming exposure, so the sweep holds
+        a few blocks of samples in memory however long the dwell is.
+        Args:
+            center_freqs (list[float]): Center frequencies in MHz, ascending.
+                Steps should overlap by at least 2 * trim of the bandwidth.
+            dwell (float): Seconds of samples per step; defaults to the
+                integration time.
+            settle (float): Seconds of samples discarded after each retune
+                while the PLL settles and stale samples drain.
+            trim (float): Fraction of each step's band dropped at either edge.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB.
+            overhead_time: datetime.timedelta Time beyond the summed dwells.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot sweep.")
+        dwell = self._integration_time if dwell is None else dwell
+        n_blocks = max(1, round(dwell * self._sample_rate / self._sample_size))
+        settle_bytes = 2 * int(settle * self._sample_rate)
+        if self._ring is None:
+            self._ring = IQRing(self._ring_size, self._sample_size)
+        engine = self._spectrum_engine()
+        capture = StreamingCapture(self._ring, self._read_into, engine.accumulate)
+
+        start_time = datetime.now(timezone.utc)
+        spectra = []
+        self.dropped_blocks = 0
+        self.flags = None
+        if self.timer is not None:
+            self.timer.begin()
+        try:
+            for center_freq in center_freqs:
+                self.sdr.set_center_freq(center_freq * 1e6)
+                if settle_bytes:
+                    self.sdr.read_bytes(settle_bytes)
+                engine.reset()
+                engine.center_freq = center_freq * 1e6
+                self.dropped_blocks += capture.run(n_blocks)
+                # Only bin_size values per step are kept for the stitch.
+                spectra.append((engine.freqs, engine.psd()))
+        finally:
+            self.sdr.set_center_freq(self.get_center_freq)
+            engine.center_freq = self.get_center_freq
+            if self.timer is not None:
+                self.timer.end(self.dropped_blocks)
+        if self.dropped_blocks:
+            print(f"Processing fell behind: {self.dropped_blocks} blocks dropped.")
+
+        freqs, psd = stitch_spectra(spectra, trim)
+        end_time = datetime.now(timezone.utc)
+        overhead = end_time - start_time - timedelta(seconds=len(center_freqs) * dwell)
+        return freqs, 10 * np.log10(psd), overhead
+
+    def take_fs_exposure(
+        self,
+        offset: float = 0.8,
+        cadence: float = 0.25,
+        settle: float = 0.02,
+    ):
+        """
+        Take a frequency-switched exposure: alternate the center frequency
+        between center_freq + offset / 2 (signal) and center_freq - offset / 2
+        (reference) every cadence seconds, integrating the two phases
+        separately, then fold them into an ON-OFF spectrum. The line is in
+        band in both phases, so no slew to an OFF position is needed.
+        Args:
+            offset (float): Switching throw in MHz, rounded to whole channels;
+                larger than the line is wide and less than the bandwidth.
+            cadence (float): Seconds of samples per phase before switching.
+            settle (float): Seconds of samples discarded after each switch.
+        Returns:
+            freqs: float[] Frequencies in Hz, over the band both phases share.
+            powers: float[] ON-OFF power difference in dB.
+            overhead_time: datetime.timedelta Overhead time taken for the exposure.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot take exposure.")
+        spacing = self._sample_rate / self._bin_size
+        shift = round(offset * 1e6 / spacing)
+        if not 0 < shift < self._bin_size:
+            raise ValueError("The switching offset must be within the bandwidth.")
+        throw = shift * spacing
+        phases = [self.get_center_freq + throw / 2, self.get_center_freq - throw / 2]
+
+        engines = [self._spectrum_engine()]
+        engines.append(
+            SpectrumEngine(
+                self._bin_size,
+                self._sample_rate,
+                phases[1],
+                self._sample_size,
+                window=self._window,
+                dtype=self._fft_dtype,
+            )
+        )
+        engines[0].center_freq = phases[0]
+        if self._block is None:
+            self._block = np.empty(self._sample_size, dtype=np.complex64)
+        blocks_per_phase = max(1, round(cadence * self._sample_rate / self._sample_size))
+        # Whole switching cycles adding up to the integration time.
+        cycles = max(1, round(self._n_blocks / (2 * blocks_per_phase)))
+        settle_bytes = 2 * int(settle * self._sample_rate)
+
+        start_time = datetime.now(timezone.utc)
+        self.dropped_blocks = 0
+        self.flags = None
+        if self.timer is not None:
+            self.timer.begin()
+        try:
+            for _ in range(cycles):
+                for center_freq, engine in zip(phases, engines):
+                    self.sdr.set_center_freq(center_freq)
+                    if settle_bytes:
+                        self.sdr.read_bytes(settle_bytes)
+                    for _ in range(blocks_per_phase):
+                        self._read_into(self._block)
+                        engine.accumulate(self._block)
+        finally:
+            self.sdr.set_center_freq(self.get_center_freq)
+            if self.timer is not None:
+                self.timer.end(self.dropped_blocks)
+
+        # Per baseband channel the bandpass is the same in both phases, so the
+        # ratio cancels it. The line then shows up positive in the signal
+        # phase and, `shift` channels higher, negative in the reference.
+        difference = 10 * np.log10(engines[0].psd() / engines[1].psd())
+        folded = (difference[: self._bin_size - shift] - difference[shift:]) / 2
+        freqs = engines[0].freqs[: self._bin_size - shift]
+
+        end_time = datetime.now(timezone.utc)
+        integrated = 2 * cycles * blocks_per_phase * self._sample_size / self._sample_rate
+        return freqs, folded, end_time - start_time - timedelta(seconds=integrated)
+
+    def iter_exposure(
+        self,
+        interval: float = 5.0,
+        target_snr: float | None = None,
+        line_half_width: float = LINE_HALF_WIDTH,
+    ):
+        """
+        Take an exposure, yielding the running average every interval seconds.
+        Always streams through the native engine, whatever the configured mode,
+        with RFI flagging and profiling applied as in take_exposure.
+        The caller can stop early simply by breaking out of the loop.
+        Args:
+            interval (float): Seconds of samples between updates.
+            target_snr (float): Stop once the H I line reaches this SNR.
+            line_half_width (float): Half-width of the H I line window in Hz.
+        Yields:
+            ExposureUpdate: The spectrum so far, with its noise and line SNR;
+            both are NaN when the line window is not inside the band.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot take exposure.")
+        if self._ring is None:
+            self._ring = IQRing(self._ring_size, self._sample_size)
+        self.dropped_blocks = 0
+        self.flags = None
+        if self.timer is not None:
+            self.timer.begin()
+        integrator = self._integrator()
+        n_blocks = self._n_blocks
+        per_update = max(1, round(interval * self._sample_rate / self._sample_size))
+
+        capture = StreamingCapture(self._ring, self._read_into, integrator.accumulate)
+        try:
+            for i, buffer in enumerate(capture.iter_blocks(n_blocks), 1):
+                integrator.accumulate(buffer)
+                if i % per_update and i != n_blocks:
+                    continue
+                if isinstance(integrator, FlaggedIntegration):
+                    freqs, powers, self.flags = integrator.spectrum()
+                else:
+                    freqs, powers = integrator.spectrum()
+                noise, snr = self._line_snr(freqs, powers, line_half_width)
+                self.dropped_blocks = capture.dropped
+                yield ExposureUpdate(
+                    freqs,
+                    powers,
+                    i * self._sample_size / self._sample_rate,
+                    noise,
+                    snr,
+                    capture.dropped,
+                )
+                if target_snr is not None and snr >= target_snr:
+                    print(f"Reached SNR {snr:.1f} after {i} of {n_blocks} blocks.")
+                    return
+        finally:
+            if self.timer is not None:
+                self.timer.end(self.dropped_blocks)
+
+    @staticmethod
+    def _line_snr(freqs: np.ndarray, powers: np.ndarray, half_width: float):
+        """
+        line_snr over the channels with data, or NaNs when the line window is
+        not inside the band, e.g. after tuning away from the line.
+        """
+        good = np.isfinite(powers)
+        try:
+            return line_snr(freqs[good], powers[good], half_width=half_width)
+        except ValueError:
+            return float("nan"), float("nan")
+
+    def reconnect(self):
+        """
+        Close and reopen the dongle, e.g. after a USB error, restoring the
+        gain and the bias tee.
+        """
+        if self.sdr is not None:
+            try:
+                self.sdr.close()
+            except Exception as e:
+                print(f"Ignoring error closing RTL-SDR: {e}")
+            self.sdr = None
+        with self.stage("open"):
+            self.sdr = self._open_device(
+                self._sample_rate, self.get_center_freq, self._gain
+            )
+        self.bias_tee_on()
+
+    def _checkpoint_config(self) -> dict:
+        return {
+            "bin_size": self._bin_size,
+            "sample_size": self._sample_size,
+            "sample_rate": self._sample_rate,
+            "center_freq": self.get_center_freq,
+            "window": self._window,
+            "integration_time": self._integration_time,
+        }
+
+    def long_exposure(
+        self,
+        checkpoint_path: str,
+        checkpoint_interval: float = 60.0,
+        max_retries: int = 5,
+        retry_delay: float = 2.0,
+    ):
+        """
+        Take an exposure of any length in constant memory, checkpointing the
+        running sum to disk so that it survives USB errors and restarts.
+        Only the engine's float64 accumulator and segment count are kept, so
+        memory use is the same for one second or one night. If a checkpoint
+        for the same settings exists, the exposure resumes from it.
+        Args:
+            checkpoint_path (str): Checkpoint file (.npz), removed on success.
+            checkpoint_interval (float): Seconds of samples between checkpoints.
+            max_retries (int): Reconnection attempts in a row before giving up.
+            retry_delay (float): Seconds to wait before reconnecting.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB.
+            overhead_time: datetime.timedelta Overhead time of this run.
+        """
+        if self.sdr is None:
+            raise RuntimeError("RTL-SDR is not connected. Cannot take exposure.")
+        engine = self._spectrum_engine()
+        config = self._checkpoint_config()
+        if os.path.exists(checkpoint_path):
+            with np.load(checkpoint_path) as checkpoint:
+                saved = {key: checkpoint[key].item() for key in config}
+                if saved != config:
+                    raise ValueError(
+                        f"Checkpoint {checkpoint_path} was taken with {saved}, "
+                        f"not {config}."
+                    )
+                engine.merge(checkpoint["total"], int(checkpoint["count"]))
+            print(f"Resuming from {checkpoint_path}.")
+
+        segments_per_block = self._sample_size // self._bin_size
+        target = self._n_blocks * segments_per_block
+        blocks_per_chunk = max(
+            1, round(checkpoint_interval * self._sample_rate / self._sample_size)
+        )
+        if self._block is None:
+            self._block = np.empty(self._sample_size, dtype=np.complex64)
+        if self._streaming and self._ring is None:
+            self._ring = IQRing(self._ring_size, self._sample_size)
+
+        start_time = datetime.now(timezone.utc)
+        self.dropped_blocks = 0
+        self.flags = None
+        if self.timer is not None:
+            self.timer.begin()
+        resumed = engine.count
+        failures = 0
+        try:
+            while engine.count < target:
+                remaining = (target - engine.count) // segments_per_block
+                blocks = min(blocks_per_chunk, remaining)
+                try:
+                    if self._streaming:
+                        capture = StreamingCapture(
+                            self._ring, self._read_into, engine.accumulate
+                        )
+                        self.dropped_blocks += capture.run(blocks)
+                    else:
+                        for _ in range(blocks):
+                            self._read_into(self._block)
+                            engine.accumulate(self._block)
+                    failures = 0
+                except Exception as e:
+                    # Every block is either fully in the accumulator or not at
+                    # all, so whatever was integrated before the error counts.
+                    failures += 1
+                    if failures > max_retries:
+                        raise
+                    print(f"Read failed ({e}); reconnecting, attempt {failures}.")
+                    time.sleep(retry_delay)
+                    try:
+                        self.reconnect()
+                    except Exception as reconnect_error:
+                        print(f"Reconnect failed: {reconnect_error}")
+
+                total, count = engine.partial()
+                temporary = checkpoint_path + ".tmp.npz"
+                np.savez(temporary, total=total, count=count, **config)
+                os.replace(temporary, checkpoint_path)
+                done = count * self._bin_size / self._sample_rate
+                print(
+                    f"Checkpoint: {done:.1f} of {self._integration_time} "
+                    "seconds integrated."
+                )
+        finally:
+            if self.timer is not None:
+                self.timer.end(self.dropped_blocks)
+
+        os.remove(checkpoint_path)
+        end_time = datetime.now(timezone.utc)
+        integrated = (engine.count - resumed) * self._bin_size / self._sample_rate
+        freqs, powers = engine.spectrum()
+        return freqs, powers, end_time - start_time - timedelta(seconds=integrated)
 
     def disconnect(self):
         """
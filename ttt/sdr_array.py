@@ -0,0 +1,143 @@
+"""Several RTL-SDR dongles exposing in parallel."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Callable
+
+import numpy as np
+
+from .rtlsdr import RTLSDR
+from .spectrum import stitch_spectra
+from .utils import H1_LINE
+
+
+def rtlsdr_device(device: int | str) -> Callable:
+    """
+    Make an RTLSDR device opener for one dongle among several.
+    Args:
+        device (int | str): Device index, or the dongle's serial number.
+    Returns:
+        callable: Opens the dongle as device(sample_rate, center_freq, gain).
+    """
+
+    def open_device(sample_rate: float, center_freq: float, gain: float):
+        # Imported here: pyrtlsdr loads librtlsdr on import.
+        from rtlsdr import RtlSdr
+
+        if isinstance(device, str):
+            sdr = RtlSdr(serial_number=device)
+        else:
+            sdr = RtlSdr(device_index=device)
+        sdr.sample_rate = sample_rate
+        sdr.center_freq = center_freq
+        sdr.gain = gain
+        return sdr
+
+    return open_device
+
+
+class RTLSDRArray:
+    """
+    Runs one RTLSDR per dongle, each exposing in its own thread with its own
+    processing, all starting together so their spectra cover the same time.
+    """
+
+    def __init__(
+        self,
+        devices: list,
+        center_freqs: list[float] | None = None,
+        **rtlsdr_kwargs,
+    ):
+        """
+        Args:
+            devices (list): One entry per dongle: a device index, a serial
+                number, or a device opener as RTLSDR's device argument takes.
+            center_freqs (list[float]): Center frequency of each dongle in
+                MHz; all default to center_freq, or else the H I line.
+            **rtlsdr_kwargs: Passed to every RTLSDR, e.g. integration_time,
+                gain, bin_size or engine.
+        """
+        center_freq = rtlsdr_kwargs.pop("center_freq", None)
+        if center_freqs is None:
+            center_freqs = [center_freq or H1_LINE] * len(devices)
+        elif center_freq is not None:
+            raise ValueError("Give either center_freq or center_freqs, not both.")
+        if len(center_freqs) != len(devices):
+            raise ValueError("Give one center frequency per device.")
+        self.rtls = [
+            RTLSDR(
+                center_freq=center_freq,
+                device=device if callable(device) else rtlsdr_device(device),
+                **rtlsdr_kwargs,
+            )
+            for device, center_freq in zip(devices, center_freqs)
+        ]
+        self._stack = None
+        self._executor = None
+
+    def __enter__(self):
+        """
+        Open every dongle; if any fails, the ones already open are closed.
+        Returns:
+            self: The instance of RTLSDRArray.
+        """
+        with ExitStack() as stack:
+            for rtl in self.rtls:
+                stack.enter_context(rtl)
+            self._stack = stack.pop_all()
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.rtls), thread_name_prefix="rtlsdr"
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown()
+        self._executor = None
+        self._stack.close()
+        self._stack = None
+
+    def take_exposure(self):
+        """
+        Take one exposure on every dongle at the same time.
+        Returns:
+            freqs: list[float[]] Frequencies in Hz, one array per dongle.
+            powers: list[float[]] Powers in dB, one array per dongle.
+            start_time: datetime UTC time all exposures were released.
+            overhead_time: datetime.timedelta The largest overhead of any
+                dongle.
+        """
+        if self._executor is None:
+            raise RuntimeError("RTLSDRArray is not open. Use it in a with-block.")
+        barrier = threading.Barrier(len(self.rtls))
+
+        def expose(rtl):
+            # Line every dongle up so the exposures cover the same interval.
+            barrier.wait()
+            return rtl.take_exposure()
+
+        futures = [self._executor.submit(expose, rtl) for rtl in self.rtls]
+        start_time = datetime.now(timezone.utc)
+        results = [future.result() for future in futures]
+        freqs = [r[0] for r in results]
+        powers = [r[1] for r in results]
+        return freqs, powers, start_time, max(r[2] for r in results)
+
+    def take_stitched_exposure(self, trim: float = 0.1):
+        """
+        Take one exposure on every dongle and stitch them into one spectrum,
+        for dongles tuned to adjacent, overlapping ranges.
+        Args:
+            trim (float): Fraction of each band dropped at either edge.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB.
+            overhead_time: datetime.timedelta The largest overhead of any dongle.
+        """
+        freqs, powers, _, overhead_time = self.take_exposure()
+        if any(p is None for p in powers):
+            raise RuntimeError("At least one dongle failed to take its exposure.")
+        spectra = [(f, 10 ** (p / 10)) for f, p in zip(freqs, powers)]
+        stitched_freqs, psd = stitch_spectra(spectra, trim)
+        return stitched_freqs, 10 * np.log10(psd), overhead_time
@@ -0,0 +1,231 @@
+"""A simulated RTL-SDR for running the acquisition path without hardware.
+
+SimulatedSDR has the same constructor signature as rtlobs.collect.get_sdr and
+the parts of pyrtlsdr's RtlSdr interface that RTLSDR uses, so it can be passed
+straight in as RTLSDR(device=SimulatedSDR).
+
+The sky is Gaussian receiver noise plus a Doppler-shifted H I line and any
+number of narrowband RFI tones. It is synthesised once into a pool of a
+second of samples and quantised to unsigned bytes exactly as the
+dongle's ADC would, clipping included, so reads are just slices of the pool
+and can run far faster than real time. The pool repeats, so integrating for
+longer than the pool does not keep lowering the noise.
+"""
+
+import time
+
+import numpy as np
+
+from .iq import bytes_to_iq
+from .utils import H1_LINE
+
+SPEED_OF_LIGHT = 299_792.458  # km/s
+
+# Tuner gains the R820T accepts, in dB. set_gain snaps to the nearest one.
+R820T_GAINS = [
+    0.0, 0.9, 1.4, 2.7, 3.7, 7.7, 8.7, 12.5, 14.4, 15.7, 16.6, 19.7, 20.7,
+    22.9, 25.4, 28.0, 29.7, 32.8, 33.8, 36.4, 37.2, 38.6, 40.2, 42.1, 43.4,
+    43.9, 44.5, 48.0, 49.6,
+]
+
+# Receiver noise referred to the ADC at 0 dB of tuner gain, in ADC counts.
+# At 44.5 dB this is about 26 counts RMS and nothing clips; at 48.0 dB about
+# 39 counts clips 0.1 % of bytes, and at the top gain, 49.6 dB, about 47
+# counts clips 0.7 %. Noise alone therefore clips near the top of the gain
+# table, as a real dongle with a hot LNA does; RFI clips much sooner.
+NOISE_COUNTS_0DB = 0.22
+
+# Roughly how much the dongle's USB transfer buffers hold before overflowing.
+USB_BUFFER_SECONDS = 0.25
+
+
+class SimulatedSDR:
+    """Stand-in for an RTL-SDR dongle that synthesises its samples."""
+
+    valid_gains_db = R820T_GAINS
+
+    def __init__(
+        self,
+        sample_rate: float,
+        center_freq: float,
+        gain: float,
+        velocity: float = 0.0,
+        line_strength: float = 0.05,
+        line_width: float = 25e3,
+        rfi: tuple = (),
+        rfi_power: float = 1.0,
+        realtime: bool = False,
+        pool_size: int = 1 << 21,
+        seed: int | None = None,
+    ):
+        """
+        Args:
+            sample_rate (float): Sample rate in Hz.
+            center_freq (float): Center frequency in Hz.
+            gain (float): Tuner gain in dB.
+            velocity (float): Line-of-sight velocity of the H I in km/s,
+                positive receding.
+            line_strength (float): Peak line power relative to the noise.
+            line_width (float): Gaussian FWHM of the line in Hz.
+            rfi (tuple): Absolute frequencies of RFI tones in Hz.
+            rfi_power (float): Power of each tone relative to the noise.
+            realtime (bool): Pace reads to sample_rate like real hardware.
+            pool_size (int): Number of samples synthesised before repeating.
+            seed (int): Seed for the noise generator.
+        """
+        self.sample_rate = sample_rate
+        self._center_freq = center_freq
+        self.velocity = velocity
+        self.line_strength = line_strength
+        self.line_width = line_width
+        self.rfi = tuple(rfi)
+        self.rfi_power = rfi_power
+        self.realtime = realtime
+        self.bias_tee = False
+        self._rng = np.random.default_rng(seed)
+        self._pool_size = pool_size
+        self._noise_spectrum = None
+        self._sky = None
+        self._bytes = None
+        self._cursor = 0
+        self._stream_start = None
+        self._streamed = 0
+        self.gain = self._nearest_gain(gain)
+        self._synthesise()
+
+    @staticmethod
+    def _nearest_gain(gain: float) -> float:
+        return min(R820T_GAINS, key=lambda valid: abs(valid - gain))
+
+    @property
+    def line_freq(self) -> float:
+        """
+        The Doppler-shifted H I line frequency as it arrives at the antenna.
+        Returns:
+            float: Frequency in Hz.
+        """
+        return H1_LINE * 1e6 * (1 - self.velocity / SPEED_OF_LIGHT)
+
+    def _synthesise(self):
+        """
+        Build the unit-noise sky for the current tuning, then quantise it.
+        The white noise is drawn once and kept in the frequency domain, so a
+        retune costs one inverse FFT rather than a fresh draw and two FFTs.
+        """
+        n = self._pool_size
+        if self._noise_spectrum is None:
+            noise = np.empty(n, dtype=np.complex64)
+            noise.real = self._rng.standard_normal(n, dtype=np.float32)
+            noise.imag = self._rng.standard_normal(n, dtype=np.float32)
+            noise *= np.float32(np.sqrt(0.5))
+            self._noise_spectrum = np.fft.fft(noise, out=noise)
+
+        # Shape the noise spectrum with the line profile. The pool is treated
+        # as periodic, which is exactly how it is served. Everything stays in
+        # single precision and in place, as the pool is tens of megabytes.
+        profile = np.fft.fftfreq(n, 1 / self.sample_rate).astype(np.float32)
+        profile -= np.float32(self.line_freq - self._center_freq)
+        sigma = self.line_width / (2 * np.sqrt(2 * np.log(2)))
+        profile /= np.float32(sigma)
+        profile *= profile
+        profile *= np.float32(-0.5)
+        np.exp(profile, out=profile)
+        profile *= np.float32(self.line_strength)
+        profile += np.float32(1)
+        np.sqrt(profile, out=profile)
+        sky = self._noise_spectrum * profile
+        del profile
+        np.fft.ifft(sky, out=sky)
+
+        for tone in self.rfi:
+            # Snap each tone to a pool bin so the pool wraps without a glitch.
+            cycles = round((tone - self._center_freq) * n / self.sample_rate)
+            phase = (np.arange(n) * cycles % n) * (2 * np.pi / n)
+            sky += np.sqrt(self.rfi_power) * np.exp(1j * phase).astype(np.complex64)
+        self._sky = sky
+        self._quantise()
+
+    def _quantise(self):
+        """
+        Scale the sky by the tuner gain and digitise it like the 8-bit ADC.
+        """
+        counts = NOISE_COUNTS_0DB * 10 ** (self.gain / 20)
+        interleaved = self._sky.view(np.float32) * np.float32(counts)
+        interleaved += np.float32(127.5)
+        np.rint(interleaved, out=interleaved)
+        np.clip(interleaved, 0, 255, out=interleaved)
+        self._bytes = interleaved.astype(np.uint8)
+
+    @property
+    def center_freq(self) -> float:
+        return self._center_freq
+
+    @center_freq.setter
+    def center_freq(self, freq: float):
+        self.set_center_freq(freq)
+
+    def set_center_freq(self, freq: float):
+        """
+        Retune, which moves the line and RFI within the band.
+        Args:
+            freq (float): Center frequency in Hz.
+        """
+        self._center_freq = freq
+        self._synthesise()
+
+    def set_gain(self, gain: float):
+        """
+        Set the tuner gain, snapped to the nearest R820T gain step.
+        Args:
+            gain (float): Gain in dB.
+        """
+        self.gain = self._nearest_gain(gain)
+        self._quantise()
+
+    def set_bias_tee(self, enabled: bool):
+        self.bias_tee = enabled
+
+    def read_bytes(self, num_bytes: int) -> np.ndarray:
+        """
+        Read interleaved unsigned 8-bit IQ, like RtlSdr.read_bytes.
+        Args:
+            num_bytes (int): Number of bytes, two per sample.
+        Returns:
+            np.ndarray: A new uint8 array of num_bytes.
+        """
+        pool = self._bytes
+        start = self._cursor
+        if start + num_bytes <= pool.size:
+            data = pool[start : start + num_bytes].copy()
+        else:
+            data = np.take(pool, np.arange(start, start + num_bytes), mode="wrap")
+        self._cursor = (start + num_bytes) % pool.size
+
+        if self.realtime:
+            now = time.monotonic()
+            if self._stream_start is None:
+                self._stream_start = now
+            self._streamed += num_bytes // 2
+            delay = self._stream_start + self._streamed / self.sample_rate - now
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -USB_BUFFER_SECONDS:
+                # Nobody read for a while: like the real dongle, the backlog
+                # has overflowed and is gone, so do not replay it in a burst.
+                self._stream_start = now - self._streamed / self.sample_rate
+        return data
+
+    def read_samples(self, num_samples: int) -> np.ndarray:
+        """
+        Read complex samples, like RtlSdr.read_samples.
+        Args:
+            num_samples (int): Number of samples.
+        Returns:
+            np.ndarray: A new complex128 array.
+        """
+        out = np.empty(num_samples, dtype=np.complex64)
+        return bytes_to_iq(self.read_bytes(2 * num_samples), out).astype(np.complex128)
+
+    def close(self):
+        self._stream_start = None
+        self._streamed = 0
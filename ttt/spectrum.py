@@ -0,0 +1,248 @@
+"""Integrated power spectra computed natively with batched NumPy FFTs."""
+
+import time
+
+import numpy as np
+from scipy import signal
+
+from .utils import H1_LINE
+
+# Half-width of the window around the H I line treated as signal when
+# estimating noise and SNR: about +/-50 km/s of Doppler shift.
+LINE_HALF_WIDTH = 250e3  # Hz
+
+
+class SpectrumEngine:
+    """
+    Accumulate a Bartlett-averaged power spectral density.
+
+    Each block of samples is cut into as many bin_size segments as fit, and
+    all of them go through a single 2-D FFT. The window, the segment buffer
+    and the power buffer are allocated once, so integrating a block allocates
+    nothing bigger than bin_size.
+    """
+
+    def __init__(
+        self,
+        bin_size: int,
+        sample_rate: float,
+        center_freq: float,
+        block_size: int,
+        window: str = "boxcar",
+        detrend: bool = True,
+        dtype=np.complex64,
+        kurtosis: bool = False,
+    ):
+        """
+        Args:
+            bin_size (int): Number of frequency bins, i.e. the FFT length.
+            sample_rate (float): Sample rate in Hz.
+            center_freq (float): Center frequency in Hz.
+            block_size (int): Largest number of samples passed per accumulate().
+            window (str): Any window name scipy.signal.get_window accepts.
+            detrend (bool): Subtract each segment's mean before the FFT, as
+                scipy.signal.welch does by default.
+            dtype: Complex working precision, complex64 or complex128.
+            kurtosis (bool): Also accumulate the sum of squared periodograms,
+                which spectral kurtosis RFI flagging needs.
+        """
+        self.bin_size = bin_size
+        self.sample_rate = sample_rate
+        self.center_freq = center_freq
+        self.detrend = detrend
+        self.dtype = np.dtype(dtype)
+        real_dtype = np.finfo(self.dtype).dtype
+
+        segments = max(1, block_size // bin_size)
+        self._window = signal.get_window(window, bin_size).astype(real_dtype)
+        self._work = np.empty((segments, bin_size), dtype=self.dtype)
+        self._power = np.empty((segments, bin_size), dtype=real_dtype)
+        # Density scaling, matching scipy.signal.welch(scaling="density").
+        self.scale = 1.0 / (sample_rate * float(np.sum(self._window**2)))
+
+        self._total = np.zeros(bin_size)
+        self._total_sq = np.zeros(bin_size) if kurtosis else None
+        self.count = 0
+        # Set to a ttt.timing.StageTimer to time the fft and accumulate stages.
+        self.timer = None
+
+    def reset(self):
+        """
+        Discard everything accumulated so far.
+        """
+        self._total[:] = 0
+        if self._total_sq is not None:
+            self._total_sq[:] = 0
+        self.count = 0
+
+    def accumulate(self, samples: np.ndarray):
+        """
+        Add the periodograms of every whole segment in samples to the total.
+        Samples past the last whole segment are ignored.
+        Args:
+            samples (np.ndarray): Complex IQ samples.
+        """
+        capacity = self._work.shape[0]
+        n_segments = len(samples) // self.bin_size
+        for start in range(0, n_segments, capacity):
+            n = min(capacity, n_segments - start)
+            segments = samples[
+                start * self.bin_size : (start + n) * self.bin_size
+            ].reshape(n, self.bin_size)
+            work = self._work[:n]
+            power = self._power[:n]
+
+            if self.timer is not None:
+                started = time.perf_counter()
+            if self.detrend:
+                np.subtract(segments, segments.mean(axis=1, keepdims=True), out=work)
+            else:
+                work[:] = segments
+            work *= self._window
+            np.fft.fft(work, axis=1, out=work)
+            if self.timer is not None:
+                transformed = time.perf_counter()
+            np.abs(work, out=power)
+            power *= power
+            self._total += power.sum(axis=0, dtype=np.float64)
+            if self._total_sq is not None:
+                self._total_sq += np.einsum("ij,ij->j", power, power, dtype=np.float64)
+            self.count += n
+            if self.timer is not None:
+                self.timer.add("fft", transformed - started)
+                self.timer.add("accumulate", time.perf_counter() - transformed)
+
+    def partial(self):
+        """
+        The raw accumulator, for merging into another engine.
+        Returns:
+            total: np.ndarray Unscaled periodogram sum in FFT order.
+            count: int Number of segments in the sum.
+        """
+        return self._total.copy(), self.count
+
+    def partial_sq(self) -> np.ndarray:
+        """
+        The raw sum of squared periodograms, when kurtosis is enabled.
+        Returns:
+            np.ndarray: Unscaled sum in FFT order.
+        """
+        if self._total_sq is None:
+            raise RuntimeError("This engine does not accumulate squared powers.")
+        return self._total_sq.copy()
+
+    def merge(self, total: np.ndarray, count: int):
+        """
+        Add another engine's partial() accumulator to this one.
+        Args:
+            total (np.ndarray): Unscaled periodogram sum in FFT order.
+            count (int): Number of segments in the sum.
+        """
+        self._total += total
+        self.count += count
+
+    @property
+    def freqs(self) -> np.ndarray:
+        """
+        Frequencies of the spectrum bins in ascending order.
+        Returns:
+            np.ndarray: Frequencies in Hz.
+        """
+        return (
+            np.fft.fftshift(np.fft.fftfreq(self.bin_size, 1 / self.sample_rate))
+            + self.center_freq
+        )
+
+    def psd(self) -> np.ndarray:
+        """
+        The averaged power spectral density, in ascending frequency order.
+        Returns:
+            np.ndarray: Linear power spectral density.
+        """
+        if self.count == 0:
+            raise RuntimeError("No samples have been accumulated.")
+        return np.fft.fftshift(self._total * (self.scale / self.count))
+
+    def spectrum(self):
+        """
+        The averaged spectrum, in the form take_exposure returns.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Powers in dB.
+        """
+        return self.freqs, 10 * np.log10(self.psd())
+
+
+def line_snr(
+    freqs: np.ndarray,
+    powers: np.ndarray,
+    line_freq: float = H1_LINE * 1e6,
+    half_width: float = LINE_HALF_WIDTH,
+    baseline_order: int = 3,
+):
+    """
+    Estimate the noise and the H I line SNR of a spectrum.
+    A polynomial fitted to the channels outside the line window stands in for
+    the bandpass; the noise is the RMS of what is left of those channels, and
+    the signal is the highest residual inside the window.
+    Args:
+        freqs (np.ndarray): Frequencies in Hz.
+        powers (np.ndarray): Powers in dB.
+        line_freq (float): Line frequency in Hz.
+        half_width (float): Half-width of the line window in Hz.
+        baseline_order (int): Order of the baseline polynomial.
+    Returns:
+        noise: float RMS of the baseline residual in dB.
+        snr: float Peak line residual over the noise.
+    """
+    in_line = np.abs(freqs - line_freq) <= half_width
+    if in_line.all() or not in_line.any():
+        raise ValueError("The line window must cover some, but not all, channels.")
+    # Fit in MHz offsets so the polynomial stays well conditioned.
+    x = (freqs - line_freq) / 1e6
+    coefficients = np.polyfit(x[~in_line], powers[~in_line], baseline_order)
+    residual = powers - np.polyval(coefficients, x)
+    noise = float(np.std(residual[~in_line]))
+    if noise == 0:
+        return noise, float("inf")
+    return noise, float(residual[in_line].max() / noise)
+
+
+def stitch_spectra(spectra, trim: float = 0.1):
+    """
+    Join overlapping spectra taken at different center frequencies into one.
+    The outer trim fraction of every spectrum is dropped, since the RTL-SDR's
+    anti-alias filter rolls off there. What remains is combined on a uniform
+    grid, each spectrum weighted by a triangle peaking at its own center so
+    that overlaps cross-fade instead of stepping.
+    Args:
+        spectra: Iterable of (freqs, psd) pairs, freqs ascending in Hz and
+            psd linear, all with the same channel spacing.
+        trim (float): Fraction of channels dropped from each edge.
+    Returns:
+        freqs: np.ndarray Frequencies in Hz.
+        psd: np.ndarray Linear power spectral density, NaN in any gaps.
+    """
+    trimmed = []
+    for freqs, psd in spectra:
+        edge = int(len(freqs) * trim)
+        trimmed.append((freqs[edge : len(freqs) - edge], psd[edge : len(psd) - edge]))
+    if not trimmed:
+        raise ValueError("Nothing to stitch.")
+    spacing = trimmed[0][0][1] - trimmed[0][0][0]
+    low = min(f[0] for f, _ in trimmed)
+    high = max(f[-1] for f, _ in trimmed)
+    grid = low + spacing * np.arange(round((high - low) / spacing) + 1)
+    total = np.zeros_like(grid)
+    weight = np.zeros_like(grid)
+
+    for freqs, psd in trimmed:
+        inside = (grid >= freqs[0]) & (grid <= freqs[-1])
+        span = grid[inside]
+        # Small floor so a lone spectrum still counts at its trimmed edges.
+        w = 1.0 - np.abs(2 * (span - freqs[0]) / (freqs[-1] - freqs[0]) - 1) + 1e-3
+        total[inside] += w * np.interp(span, freqs, psd)
+        weight[inside] += w
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return grid, np.where(weight > 0, total / weight, np.nan)
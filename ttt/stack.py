@@ -0,0 +1,202 @@
+"""Weighted stacking of many spectra in constant memory.
+
+Spectra are added one at a time to running per-channel sums of weight and
+weighted power, so a stack of any length holds only a few bin_size arrays.
+Each spectrum is weighted by its inverse noise variance. The noise comes
+from the channel-to-channel scatter, which ignores both the bandpass and
+the line. Where that cannot be measured, the integration time stands in
+for it, since radiometer noise falls as 1 / sqrt(time).
+"""
+
+from collections.abc import Iterable
+
+import numpy as np
+
+from .file_io import load_observation, parse_observation
+from .rfi import MAD_TO_SIGMA
+
+# dB per unit of fractional power change, for small changes.
+DB_PER_FRACTION = 10 / np.log(10)
+
+
+def channel_noise(powers: np.ndarray) -> float:
+    """
+    Robust per-channel noise of a spectrum from its first differences.
+    Differencing neighbouring channels cancels anything smoother than a
+    channel, such as the bandpass and the line.
+    Args:
+        powers (np.ndarray): Powers, NaN where missing.
+    Returns:
+        float: Standard deviation of one channel's noise, NaN if unknown.
+    """
+    diffs = np.diff(powers)
+    diffs = diffs[np.isfinite(diffs)]
+    if diffs.size < 8:
+        return np.nan
+    mad = np.median(np.abs(diffs - np.median(diffs)))
+    return float(MAD_TO_SIGMA * mad / np.sqrt(2))
+
+
+def radiometer_noise(
+    channel_width: float, integration_time: float, difference: bool = True
+) -> float:
+    """
+    Noise the radiometer equation predicts for a spectrum in dB.
+    Args:
+        channel_width (float): Channel width in Hz.
+        integration_time (float): Integration time in seconds.
+        difference (bool): The spectrum is ON minus OFF, each integrated for
+            integration_time, which doubles the variance.
+    Returns:
+        float: Standard deviation of one channel in dB.
+    """
+    fraction = 1 / np.sqrt(channel_width * integration_time)
+    return float(DB_PER_FRACTION * fraction * (np.sqrt(2) if difference else 1))
+
+
+class SpectrumStack:
+    """Running inverse-variance weighted average of spectra."""
+
+    def __init__(self, freqs: np.ndarray | None = None, difference: bool = True):
+        """
+        Args:
+            freqs (np.ndarray): Frequency grid in Hz to stack on; defaults to
+                that of the first spectrum added. Spectra on any other grid
+                are linearly resampled onto it.
+            difference (bool): The spectra are ON minus OFF, which sets the
+                expected radiometer noise.
+        """
+        self.difference = difference
+        self.freqs = None
+        self.count = 0
+        self.resampled = 0
+        self._sum_w = None
+        self._sum_wx = None
+        self._total_w = 0.0  # sum of weights
+        self._total_w2_t = 0.0  # sum of weight**2 / integration time
+        if freqs is not None:
+            self._start(freqs)
+
+    def _start(self, freqs: np.ndarray):
+        self.freqs = np.asarray(freqs, dtype=float)
+        self._sum_w = np.zeros(self.freqs.size)
+        self._sum_wx = np.zeros(self.freqs.size)
+
+    def add(
+        self,
+        freqs: np.ndarray,
+        powers: np.ndarray,
+        integration_time: float,
+        noise: float | None = None,
+    ) -> float:
+        """
+        Add one spectrum to the stack.
+        Args:
+            freqs (np.ndarray): Frequencies in Hz, ascending.
+            powers (np.ndarray): Powers, NaN for channels to leave out.
+            integration_time (float): Integration time in seconds.
+            noise (float): Per-channel noise; measured from the spectrum if
+                None.
+        Returns:
+            float: The weight the spectrum was given, 0 if skipped.
+        """
+        if self.freqs is None:
+            self._start(freqs)
+        if freqs is not self.freqs and not np.array_equal(freqs, self.freqs):
+            powers = np.interp(self.freqs, freqs, powers, left=np.nan, right=np.nan)
+            self.resampled += 1
+        if noise is None:
+            noise = channel_noise(powers)
+        if np.isfinite(noise) and noise > 0:
+            weight = 1 / noise**2
+        else:
+            # Radiometer noise variance falls as 1 / time.
+            weight = integration_time
+        if integration_time <= 0 or weight == 0:
+            return 0.0
+
+        good = np.isfinite(powers)
+        self._sum_w[good] += weight
+        self._sum_wx[good] += weight * powers[good]
+        self._total_w += weight
+        self._total_w2_t += weight**2 / integration_time
+        self.count += 1
+        return weight
+
+    def extend(self, spectra: Iterable) -> "SpectrumStack":
+        """
+        Add spectra from any iterable, e.g. a generator that loads them one
+        at a time, so only one is held in memory.
+        Args:
+            spectra (Iterable): (freqs, powers, integration_time) tuples.
+        Returns:
+            SpectrumStack: self.
+        """
+        for freqs, powers, integration_time in spectra:
+            self.add(freqs, powers, integration_time)
+        return self
+
+    @property
+    def effective_integration_time(self) -> float:
+        """
+        Integration time of a single spectrum as noisy as the stack, taking
+        each spectrum's noise variance as inversely proportional to its
+        integration time. Equals the summed integration time when the
+        weights follow integration time.
+        """
+        if self._total_w2_t == 0:
+            return 0.0
+        return self._total_w**2 / self._total_w2_t
+
+    @property
+    def channel_width(self) -> float:
+        """Spacing of the stack's grid in Hz."""
+        return float(np.median(np.diff(self.freqs)))
+
+    @property
+    def expected_noise(self) -> float:
+        """Radiometer-equation noise of the stack in dB per channel."""
+        return radiometer_noise(
+            self.channel_width, self.effective_integration_time, self.difference
+        )
+
+    def spectrum(self):
+        """
+        The stacked spectrum.
+        Returns:
+            freqs: float[] Frequencies in Hz.
+            powers: float[] Weighted mean powers, NaN where nothing was added.
+        """
+        if self.freqs is None:
+            raise ValueError("Nothing has been stacked.")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            powers = np.where(self._sum_w > 0, self._sum_wx / self._sum_w, np.nan)
+        return self.freqs, powers
+
+    @property
+    def noise(self) -> float:
+        """Measured per-channel noise of the stacked spectrum."""
+        return channel_noise(self.spectrum()[1])
+
+
+def stack_observations(
+    observations: Iterable, difference: bool = True
+) -> SpectrumStack:
+    """
+    Stack archived observations, loading one at a time.
+    Args:
+        observations (Iterable): (date_str, observation_str) pairs, e.g. from
+            the date and observation columns of file_io.query_catalog.
+        difference (bool): Stack ON minus OFF; otherwise stack the ON spectra.
+    Returns:
+        SpectrumStack: The stack.
+    """
+
+    def spectra():
+        for date_str, observation_str in observations:
+            _, _, integration_time = parse_observation(observation_str)
+            observation = load_observation(date_str, observation_str)
+            powers = observation.difference if difference else observation.on
+            yield observation.freqs, powers, integration_time
+
+    return SpectrumStack(difference=difference).extend(spectra())
@@ -0,0 +1,383 @@
+"""One append-only file of spectra per observing night.
+
+The file starts with a short file header, followed by one chunk per
+spectrum. Each chunk is a fixed-size metadata record followed by the
+spectrum itself. Appending writes one chunk at the end of the file and never
+touches the rest, so it costs the same however full the night is. Reading a
+row seeks straight to its chunk; opening a store only reads the metadata
+records, jumping over the spectra between them.
+
+Version 2 chunks are compact. The frequency axis of a spectrum is almost
+always evenly spaced, so it is kept in the record as start and step rather
+than stored; powers are float32, optionally shuffled bytewise and
+zlib-compressed, and RFI flags are packed to bits. Version 1 chunks, which
+hold float64 frequencies and powers and a byte per flag, are still read,
+and appends to a version 1 file stay in version 1.
+
+A chunk left half written by a crash is ignored when reading and
+overwritten by the next append. Appends hold an exclusive lock on the file,
+so a writer never mistakes another writer's chunk in progress for one.
+"""
+
+import os
+import threading
+import zlib
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows; only threads of one process are serialised
+    fcntl = None
+
+MAGIC = b"TTTSPECS"
+VERSION = 2
+FILE_HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4")])
+_COMMON_FIELDS = [
+    ("observation", "S32"),  # HHMMSS_{gain}dB_{t}s folder name
+    ("type", "S12"),  # SpectrumType value
+    ("utc", "<i8"),  # microseconds since the Unix epoch
+    ("gain", "<f8"),  # dB
+    ("integration_time", "<f8"),  # seconds
+    ("ra", "<f8"),  # hours, NaN if unknown
+    ("dec", "<f8"),  # degrees, NaN if unknown
+    ("n_channels", "<u4"),
+    ("has_flags", "u1"),
+]
+ROW_DTYPES = {
+    1: np.dtype(_COMMON_FIELDS),
+    2: np.dtype(
+        _COMMON_FIELDS
+        + [
+            ("freq_start", "<f8"),  # Hz, NaN if the frequencies are stored
+            ("freq_step", "<f8"),  # Hz
+            ("compressed", "u1"),  # powers are shuffled and zlib-compressed
+            ("nbytes", "<u4"),  # bytes of spectrum after the record
+        ]
+    ),
+}
+ROW_DTYPE = ROW_DTYPES[VERSION]
+
+
+@lru_cache(maxsize=64)
+def frequency_axis(start: float, step: float, count: int) -> np.ndarray:
+    """
+    An evenly spaced frequency axis, shared by every spectrum that has it.
+    Args:
+        start (float): First frequency in Hz.
+        step (float): Spacing in Hz.
+        count (int): Number of channels.
+    Returns:
+        np.ndarray: Read-only frequencies in Hz.
+    """
+    freqs = start + step * np.arange(count)
+    freqs.setflags(write=False)
+    return freqs
+
+
+def linear_axis(freqs: np.ndarray) -> tuple[float, float] | None:
+    """
+    Check whether a frequency axis is evenly spaced.
+    Args:
+        freqs (np.ndarray): Frequencies in Hz.
+    Returns:
+        tuple: Start and step in Hz, or None if it is not evenly spaced.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    if freqs.size < 2:
+        return None
+    start = float(freqs[0])
+    step = float(freqs[-1] - freqs[0]) / (freqs.size - 1)
+    if step == 0 or not np.allclose(
+        freqs, start + step * np.arange(freqs.size), rtol=0, atol=abs(step) * 1e-6
+    ):
+        return None
+    return start, step
+
+
+def encode_powers(powers: np.ndarray, compress: bool) -> bytes:
+    """
+    Powers as float32 bytes, optionally shuffled and zlib-compressed.
+    Shuffling groups the bytes of like significance together, which is what
+    lets zlib find anything to compress in noisy spectra.
+    """
+    data = np.ascontiguousarray(powers, dtype="<f4")
+    if not compress:
+        return data.tobytes()
+    shuffled = data.view(np.uint8).reshape(-1, 4).T
+    return zlib.compress(shuffled.tobytes())
+
+
+def decode_powers(data, count: int, compressed: bool) -> np.ndarray:
+    """
+    Reverse encode_powers. Uncompressed powers are a view of data.
+    """
+    if not compressed:
+        return np.frombuffer(data, dtype="<f4", count=count)
+    shuffled = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+    return shuffled.reshape(4, count).T.copy().view("<f4").ravel()
+
+
+class SpectrumStore:
+    """Reads and appends the spectra of one night."""
+
+    def __init__(self, path: str, compress: bool = False, mmap: bool = False):
+        """
+        Args:
+            path (str): Store file; created on the first append.
+            compress (bool): Compress the powers of appended spectra.
+            mmap (bool): Read through a read-only memory map, so that read
+                returns views into it rather than copies, except for
+                compressed powers.
+        """
+        self.path = path
+        self.compress = compress
+        self.mmap = mmap
+        # Held while the index is read or extended, so one instance can be
+        # shared between threads.
+        self._lock = threading.RLock()
+        self._reset()
+        self._refresh()
+
+    def _reset(self):
+        self._map = None
+        self.version = VERSION
+        self._rows = np.empty(0, dtype=ROW_DTYPE)
+        self._offsets = []  # file offset of each row's metadata record
+        self._end = FILE_HEADER_DTYPE.itemsize  # end of the last complete chunk
+
+    @property
+    def _row_dtype(self) -> np.dtype:
+        return ROW_DTYPES[self.version]
+
+    def _chunk_bytes(self, row) -> int:
+        if self.version >= 2:
+            return int(row["nbytes"])
+        n = int(row["n_channels"])
+        return 16 * n + (n if row["has_flags"] else 0)
+
+    def _refresh(self):
+        """
+        Index any chunks appended since the store was last read, possibly by
+        another process.
+        """
+        with self._lock:
+            self._refresh_unlocked()
+
+    def _refresh_unlocked(self):
+        if not os.path.exists(self.path):
+            self._reset()
+            return
+        size = os.path.getsize(self.path)
+        if size < self._end:
+            self._reset()  # replaced by a smaller file
+        elif size == self._end and self._offsets:
+            return
+        rows = []
+        with open(self.path, "rb") as f:
+            if not self._offsets:
+                header = np.fromfile(f, dtype=FILE_HEADER_DTYPE, count=1)
+                if header.size == 0 or header["magic"][0] != MAGIC:
+                    raise ValueError(f"{self.path} is not a spectrum store.")
+                if int(header["version"][0]) not in ROW_DTYPES:
+                    raise ValueError(
+                        f"{self.path} has unsupported version {header['version'][0]}."
+                    )
+                self.version = int(header["version"][0])
+                self._rows = np.empty(0, dtype=self._row_dtype)
+            row_size = self._row_dtype.itemsize
+            offset = self._end
+            while offset + row_size <= size:
+                f.seek(offset)
+                row = np.frombuffer(f.read(row_size), dtype=self._row_dtype)[0]
+                end = offset + row_size + self._chunk_bytes(row)
+                if end > size:
+                    break  # half-written chunk
+                rows.append(row)
+                self._offsets.append(offset)
+                offset = end
+        self._end = offset
+        if rows:
+            self._rows = np.concatenate(
+                [self._rows, np.array(rows, dtype=self._row_dtype)]
+            )
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._offsets)
+
+    @property
+    def rows(self) -> np.ndarray:
+        """
+        The metadata of every row, without any spectra.
+        Returns:
+            np.ndarray: Structured array with the fields of ROW_DTYPES for
+            the file's version.
+        """
+        self._refresh()
+        return self._rows
+
+    def _encode(self, row: np.ndarray, freqs, powers, flags, compress) -> list[bytes]:
+        """
+        Fill in the layout fields of row and return the chunk's spectrum bytes.
+        """
+        if self.version == 1:
+            parts = [
+                np.asarray(freqs, dtype="<f8").tobytes(),
+                np.asarray(powers, dtype="<f8").tobytes(),
+            ]
+            if flags is not None:
+                parts.append(np.asarray(flags, dtype=np.uint8).tobytes())
+            return parts
+
+        parts = []
+        axis = linear_axis(freqs)
+        if axis is None:
+            row["freq_start"], row["freq_step"] = np.nan, np.nan
+            parts.append(np.asarray(freqs, dtype="<f8").tobytes())
+        else:
+            row["freq_start"], row["freq_step"] = axis
+        row["compressed"] = compress
+        parts.append(encode_powers(powers, compress))
+        if flags is not None:
+            parts.append(np.packbits(np.asarray(flags, dtype=bool)).tobytes())
+        row["nbytes"] = sum(len(p) for p in parts)
+        return parts
+
+    def append(
+        self,
+        freqs: np.ndarray,
+        powers: np.ndarray,
+        spectrum_type: str,
+        observation: str,
+        gain: float,
+        integration_time: float,
+        utc: datetime | None = None,
+        pointing: tuple[float, float] | None = None,
+        flags: np.ndarray | None = None,
+        compress: bool | None = None,
+    ) -> int:
+        """
+        Append one spectrum.
+        Args:
+            freqs (np.ndarray): Frequencies in Hz.
+            powers (np.ndarray): Powers in dB.
+            spectrum_type (str): SpectrumType value, e.g. "on".
+            observation (str): Observation folder name.
+            gain (float): Gain in dB.
+            integration_time (float): Integration time in seconds.
+            utc (datetime): Time of the spectrum, default now.
+            pointing (tuple[float, float]): RA in hours and Dec in degrees.
+            flags (np.ndarray): Optional RFI mask, True for flagged channels.
+            compress (bool): Compress the powers; defaults to the store's
+                setting.
+        Returns:
+            int: The new row's index.
+        """
+        utc = utc or datetime.now(timezone.utc)
+        ra, dec = pointing if pointing is not None else (np.nan, np.nan)
+        compress = self.compress if compress is None else compress
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(self.path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when f is closed
+            if os.fstat(f.fileno()).st_size == 0:
+                self._reset()
+                np.array([(MAGIC, self.version)], dtype=FILE_HEADER_DTYPE).tofile(f)
+                f.flush()
+            # Only now is it known where the last complete chunk ends.
+            self._refresh_unlocked()
+
+            row = np.zeros(1, dtype=self._row_dtype)
+            row["observation"] = observation
+            row["type"] = spectrum_type
+            row["utc"] = round(utc.timestamp() * 1e6)
+            row["gain"] = gain
+            row["integration_time"] = integration_time
+            row["ra"] = ra
+            row["dec"] = dec
+            row["n_channels"] = len(powers)
+            row["has_flags"] = flags is not None
+            parts = self._encode(row, freqs, powers, flags, compress)
+            parts.insert(0, row.tobytes())
+
+            if os.fstat(f.fileno()).st_size > self._end:
+                # Drops any half-written chunk left by a crash.
+                f.truncate(self._end)
+            f.write(b"".join(parts))
+            self._offsets.append(self._end)
+            self._end += sum(len(p) for p in parts)
+            self._rows = np.concatenate([self._rows, row])
+            return len(self._offsets) - 1
+
+    def read(self, index: int):
+        """
+        Read one row's spectrum without loading the others.
+        Args:
+            index (int): Row index.
+        Returns:
+            freqs: float[] Frequencies in Hz, read-only and shared between
+                rows with the same axis.
+            powers: float[] Powers in dB.
+            flags: bool[] RFI mask, or None if none was saved.
+        """
+        self._refresh()
+        row = self._rows[index]
+        n = int(row["n_channels"])
+        start = self._offsets[index] + self._row_dtype.itemsize
+        size = self._chunk_bytes(row)
+        if self.mmap:
+            if self._map is None or self._map.size < self._end:
+                self._map = np.memmap(self.path, dtype=np.uint8, mode="r")
+            data = self._map[start : start + size]
+        else:
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                data = np.frombuffer(f.read(size), dtype=np.uint8)
+
+        if self.version == 1:
+            freqs = data[: 8 * n].view("<f8")
+            powers = data[8 * n : 16 * n].view("<f8")
+            flags = data[16 * n :].astype(bool) if row["has_flags"] else None
+            return freqs, powers, flags
+
+        position = 0
+        if np.isnan(row["freq_start"]):
+            freqs = data[: 8 * n].view("<f8")
+            position = 8 * n
+        else:
+            freqs = frequency_axis(float(row["freq_start"]), float(row["freq_step"]), n)
+        flag_bytes = (n + 7) // 8 if row["has_flags"] else 0
+        powers = decode_powers(
+            data[position : size - flag_bytes], n, bool(row["compressed"])
+        )
+        flags = None
+        if row["has_flags"]:
+            flags = np.unpackbits(data[size - flag_bytes :], count=n).astype(bool)
+        return freqs, powers, flags
+
+    def find(self, observation: str, spectrum_type: str) -> int | None:
+        """
+        Find the latest row of an observation with the given type.
+        Args:
+            observation (str): Observation folder name.
+            spectrum_type (str): SpectrumType value.
+        Returns:
+            int: Row index, or None if there is no such row.
+        """
+        rows = self.rows
+        matches = np.flatnonzero(
+            (rows["observation"] == observation.encode())
+            & (rows["type"] == spectrum_type.encode())
+        )
+        return int(matches[-1]) if matches.size else None
+
+    def observations(self) -> list[str]:
+        """
+        Names of the observations in the store.
+        Returns:
+            list[str]: Observation folder names, sorted.
+        """
+        return sorted({o.decode() for o in self.rows["observation"]})
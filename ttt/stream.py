@@ -0,0 +1,139 @@
+"""Overlapped IQ capture: a reader thread fills a ring of preallocated buffers
+while the calling thread turns the filled ones into spectra.
+
+The dongle keeps streaming into its USB buffers whether or not anybody reads
+them, so the reader must never wait on the FFT. When every slot in the ring is
+still waiting to be processed the reader reads the block anyway, into a
+scratch buffer, and counts it as dropped rather than stalling the device.
+"""
+
+import queue
+import threading
+from typing import Callable
+
+import numpy as np
+
+
+class IQRing:
+    """A fixed set of preallocated IQ buffers handed between two threads."""
+
+    def __init__(self, slots: int, sample_size: int, dtype=np.complex64):
+        """
+        Allocate the ring.
+        Args:
+            slots (int): Number of buffers in the ring, at least 2.
+            sample_size (int): Number of IQ samples per buffer.
+            dtype: Sample dtype of the buffers.
+        """
+        if slots < 2:
+            raise ValueError("An IQ ring needs at least two slots.")
+        self.buffers = [np.empty(sample_size, dtype=dtype) for _ in range(slots)]
+        self.scratch = np.empty(sample_size, dtype=dtype)
+        self._free = queue.Queue()
+        self._filled = queue.Queue()
+        self.reset()
+
+    def reset(self):
+        """
+        Mark every slot as free and forget anything queued for processing.
+        """
+        for q in (self._free, self._filled):
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+        for index in range(len(self.buffers)):
+            self._free.put(index)
+
+
+class StreamingCapture:
+    """Run one integration with reads and processing overlapped."""
+
+    # How long the consumer waits for a filled block before it assumes the
+    # reader has hung. A block at 2.048 MS/s is milliseconds long.
+    READ_TIMEOUT = 10.0
+
+    def __init__(
+        self,
+        ring: IQRing,
+        read_into: Callable[[np.ndarray], None],
+        process: Callable[[np.ndarray], None],
+    ):
+        """
+        Args:
+            ring (IQRing): The buffers to cycle through.
+            read_into (callable): Fills the given buffer with fresh samples.
+            process (callable): Consumes a filled buffer.
+        """
+        self._ring = ring
+        self._read_into = read_into
+        self._process = process
+        self._stop = threading.Event()
+        self._error = None
+        self.dropped = 0
+        self.blocks_read = 0
+
+    def _reader(self):
+        ring = self._ring
+        try:
+            while not self._stop.is_set():
+                try:
+                    index = ring._free.get_nowait()
+                except queue.Empty:
+                    # Consumer is behind: keep the device drained anyway.
+                    self._read_into(ring.scratch)
+                    self.blocks_read += 1
+                    self.dropped += 1
+                    continue
+                self._read_into(ring.buffers[index])
+                self.blocks_read += 1
+                ring._filled.put(index)
+        except Exception as e:
+            self._error = e
+            ring._filled.put(None)
+
+    def iter_blocks(self, n_blocks: int):
+        """
+        Capture n_blocks blocks, yielding each one to the caller in turn.
+        The buffer goes back to the reader when the caller asks for the next,
+        so anything slow done between blocks eats into the ring.
+        Args:
+            n_blocks (int): Number of blocks to yield.
+        Yields:
+            np.ndarray: A filled buffer, valid until the next iteration.
+        """
+        ring = self._ring
+        ring.reset()
+        self._stop.clear()
+        self._error = None
+        self.dropped = 0
+        self.blocks_read = 0
+
+        reader = threading.Thread(target=self._reader, name="iq-reader", daemon=True)
+        reader.start()
+        try:
+            for _ in range(n_blocks):
+                try:
+                    index = ring._filled.get(timeout=self.READ_TIMEOUT)
+                except queue.Empty:
+                    raise TimeoutError("No IQ samples arrived from the reader.")
+                if index is None:
+                    raise self._error
+                yield ring.buffers[index]
+                ring._free.put(index)
+        finally:
+            self._stop.set()
+            reader.join()
+
+    def run(self, n_blocks: int) -> int:
+        """
+        Capture and process blocks until n_blocks have been processed.
+        Args:
+            n_blocks (int): Number of blocks to process.
+        Returns:
+            int: Number of blocks the reader had to drop along the way.
+        """
+        for buffer in self.iter_blocks(n_blocks):
+            self._process(buffer)
+        return self.dropped
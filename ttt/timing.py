@@ -0,0 +1,135 @@
+"""Opt-in per-stage timing of the acquisition path."""
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Stages in the order they happen, for printing.
+STAGES = ["open", "bias_tee", "read", "convert", "fft", "accumulate", "save"]
+
+
+@dataclass
+class ExposureReport:
+    """Where the time went during one exposure."""
+
+    stages: dict = field(default_factory=dict)  # stage -> seconds
+    calls: dict = field(default_factory=dict)  # stage -> number of timings
+    dropped: int = 0  # blocks the reader could not hand to processing
+    late: int = 0  # reads that took more than twice the block duration
+    wall: float | None = None  # seconds from start to end of take_exposure
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def __str__(self) -> str:
+        names = [s for s in STAGES if s in self.stages]
+        names += [s for s in self.stages if s not in STAGES]
+        lines = [f"{'stage':<12}{'seconds':>10}{'calls':>8}"]
+        for name in names:
+            lines.append(f"{name:<12}{self.stages[name]:>10.3f}{self.calls[name]:>8}")
+        if self.wall is not None:
+            lines.append(f"{'wall':<12}{self.wall:>10.3f}")
+        lines.append(f"dropped blocks: {self.dropped}, late reads: {self.late}")
+        return "\n".join(lines)
+
+
+class StageTimer:
+    """
+    Collects stage timings into one ExposureReport per exposure and keeps the
+    most recent reports for histograms.
+
+    Stages timed outside an exposure (opening the device before the first
+    one, saving its result after) are added to the report of the exposure
+    they belong with. Each stage must only be timed from one thread at a
+    time; the reader thread and the processing thread time different stages.
+    """
+
+    def __init__(self, history: int = 100):
+        """
+        Args:
+            history (int): Number of past exposure reports to keep.
+        """
+        self.history = deque(maxlen=history)
+        self.current = ExposureReport()
+        self._started = None
+
+    def add(self, stage: str, seconds: float):
+        """
+        Record seconds spent in a stage.
+        Args:
+            stage (str): Stage name.
+            seconds (float): Time spent.
+        """
+        self.current.add(stage, seconds)
+
+    def late(self):
+        """
+        Count a read that arrived late.
+        """
+        self.current.late += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time the body of a with-block as the given stage.
+        Args:
+            name (str): Stage name.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current.add(name, time.perf_counter() - started)
+
+    def begin(self):
+        """
+        Start the report for a new exposure.
+        """
+        if self.current.wall is not None:
+            self.history.append(self.current)
+            self.current = ExposureReport()
+        self._started = time.perf_counter()
+
+    def end(self, dropped: int = 0) -> ExposureReport:
+        """
+        Finish the current exposure's report.
+        Args:
+            dropped (int): Blocks dropped during the exposure.
+        Returns:
+            ExposureReport: The report, which stays current until the next
+            begin() so that saving its result can still be added to it.
+        """
+        self.current.wall = time.perf_counter() - self._started
+        self.current.dropped = dropped
+        return self.current
+
+    def reports(self) -> list[ExposureReport]:
+        """
+        Every finished report still held, oldest first.
+        Returns:
+            list[ExposureReport]: The reports.
+        """
+        finished = list(self.history)
+        if self.current.wall is not None:
+            finished.append(self.current)
+        return finished
+
+    def histogram(self, stage: str, bins: int = 10):
+        """
+        Histogram of the time a stage took per exposure over recent exposures.
+        Args:
+            stage (str): Stage name, or "wall" for the whole exposure.
+            bins (int): Number of histogram bins.
+        Returns:
+            counts: np.ndarray Exposures per bin.
+            edges: np.ndarray Bin edges in seconds.
+        """
+        if stage == "wall":
+            values = [r.wall for r in self.reports()]
+        else:
+            values = [r.stages.get(stage, 0.0) for r in self.reports()]
+        return np.histogram(values, bins=bins)
@@ -2,6 +2,11 @@ from enum import Enum
 
 H1_LINE = 1420.405751768  # Hydrogen line frequency in MHz
 
+# Green Bank Telescope coordinates published by Green Bank Observatory.
+GREEN_BANK_LATITUDE = 38 + 25 / 60 + 59.236 / 3600  # degrees
+GREEN_BANK_LONGITUDE = -(79 + 50 / 60 + 23.406 / 3600)  # degrees
+GREEN_BANK_ELEVATION = 807.43  # meters
+
 
 class SpectrumType(Enum):
     ON = "on"
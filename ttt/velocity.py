@@ -0,0 +1,252 @@
+"""Doppler correction of spectra to the local standard of rest (LSR).
+
+Spectra are saved on a topocentric frequency axis, which the Earth's spin
+and orbit shift by up to about 30 km/s over a year. To stack across nights
+each spectrum is moved to the kinematic LSR (LSRK) and regridded onto a
+common radio velocity axis.
+
+The correction is the observer's velocity relative to the LSR projected
+onto each pointing. Only the observer's velocity needs the ephemeris, and it
+is the same for every pointing, so it is computed on a grid of times across
+each UTC day in one vectorised astropy call for all the new nights in a
+batch, and cached. Each spectrum then costs an interpolation and a dot
+product, so later batches from the same nights never touch astropy.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import FK4, ICRS, EarthLocation, SkyCoord
+from astropy.coordinates import get_body_barycentric_posvel
+from astropy.time import Time
+
+from .file_io import load_observation
+from .utils import (
+    GREEN_BANK_ELEVATION,
+    GREEN_BANK_LATITUDE,
+    GREEN_BANK_LONGITUDE,
+    H1_LINE,
+)
+
+SPEED_OF_LIGHT = 299792.458  # km/s
+SECONDS_PER_DAY = 86400
+# Seconds between grid points. The observer's velocity is a smooth orbit plus
+# a 0.3 km/s daily spin, so linear interpolation errs by under 0.01 km/s.
+GRID_STEP = 1800
+CACHE_SIZE = 366  # days of grids kept
+
+# The Sun moves at 20 km/s towards RA 18h, Dec +30 (B1900) relative to the
+# kinematic LSR, the standard solar motion of radio astronomy.
+SOLAR_MOTION = 20.0  # km/s
+SOLAR_APEX = (270.0, 30.0)  # degrees, B1900
+
+_GRID_OFFSETS = np.arange(0, SECONDS_PER_DAY + GRID_STEP, GRID_STEP)
+_grids = OrderedDict()  # day -> observer velocity in km/s, shape (3, grid)
+
+
+@lru_cache(maxsize=1)
+def site_location() -> EarthLocation:
+    """
+    The observatory's location.
+    Returns:
+        EarthLocation: The site.
+    """
+    return EarthLocation.from_geodetic(
+        GREEN_BANK_LONGITUDE * u.deg,
+        GREEN_BANK_LATITUDE * u.deg,
+        GREEN_BANK_ELEVATION * u.m,
+    )
+
+
+@lru_cache(maxsize=1)
+def _solar_motion() -> np.ndarray:
+    apex = SkyCoord(*SOLAR_APEX, unit="deg", frame=FK4(equinox="B1900"))
+    return SOLAR_MOTION * apex.transform_to(ICRS()).cartesian.xyz.value
+
+
+def _observer_velocity(times: np.ndarray) -> np.ndarray:
+    """
+    Barycentric ICRS velocity of the site in km/s at Unix times, shape
+    (3, times).
+    """
+    obstime = Time(times, format="unix")
+    _, earth = get_body_barycentric_posvel("earth", obstime)
+    _, site = site_location().get_gcrs_posvel(obstime)
+    return (earth.xyz + site.xyz).to_value(u.km / u.s)
+
+
+def _directions(ra: np.ndarray, dec: np.ndarray) -> np.ndarray:
+    ra, dec = np.radians(ra * 15), np.radians(dec)
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+
+
+def lsr_correction(utc, ra, dec) -> np.ndarray:
+    """
+    Velocity to add to a topocentric radio velocity to refer it to the LSR.
+    Args:
+        utc (array-like): Unix times in seconds.
+        ra (array-like): Right ascension in hours (ICRS).
+        dec (array-like): Declination in degrees (ICRS).
+    Returns:
+        np.ndarray: Corrections in km/s.
+    """
+    utc, ra, dec = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (utc, ra, dec))
+    )
+    shape = utc.shape
+    utc, ra, dec = utc.ravel(), ra.ravel(), dec.ravel()
+    days = np.floor(utc / SECONDS_PER_DAY).astype(int)
+    unique_days, day_index = np.unique(days, return_inverse=True)
+
+    missing = [day for day in unique_days.tolist() if day not in _grids]
+    if missing:
+        times = np.array(missing)[:, None] * SECONDS_PER_DAY + _GRID_OFFSETS
+        velocity = _observer_velocity(times.ravel()).reshape(3, *times.shape)
+        for i, day in enumerate(missing):
+            _grids[day] = velocity[:, i]
+
+    grids = np.empty((unique_days.size, 3, _GRID_OFFSETS.size))
+    for i, day in enumerate(unique_days.tolist()):
+        grids[i] = _grids[day]
+        _grids.move_to_end(day)
+    while len(_grids) > CACHE_SIZE:
+        _grids.popitem(last=False)
+
+    # Linear interpolation on the uniform grid, for all spectra at once.
+    position = (utc - days * SECONDS_PER_DAY) / GRID_STEP
+    lower = np.clip(np.floor(position).astype(int), 0, _GRID_OFFSETS.size - 2)
+    fraction = position - lower
+    below = grids[day_index, :, lower]
+    above = grids[day_index, :, lower + 1]
+    velocity = below + fraction[:, None] * (above - below) + _solar_motion()
+    correction = np.einsum("ij,ji->i", velocity, _directions(ra, dec))
+    return correction.reshape(shape)
+
+
+def radio_velocity(freqs: np.ndarray, rest_freq: float = H1_LINE * 1e6) -> np.ndarray:
+    """
+    Radio-convention velocity of each frequency relative to a rest frequency.
+    Args:
+        freqs (np.ndarray): Frequencies in Hz.
+        rest_freq (float): Rest frequency in Hz.
+    Returns:
+        np.ndarray: Velocities in km/s, positive for receding.
+    """
+    return SPEED_OF_LIGHT * (rest_freq - np.asarray(freqs)) / rest_freq
+
+
+def velocity_axis(
+    freqs: np.ndarray,
+    v_min: float = -250.0,
+    v_max: float = 250.0,
+    rest_freq: float = H1_LINE * 1e6,
+) -> np.ndarray:
+    """
+    A common velocity axis at the channel spacing of freqs.
+    Args:
+        freqs (np.ndarray): Frequencies in Hz of a typical spectrum.
+        v_min (float): Lowest velocity in km/s.
+        v_max (float): Highest velocity in km/s.
+        rest_freq (float): Rest frequency in Hz.
+    Returns:
+        np.ndarray: Ascending velocities in km/s.
+    """
+    step = abs(float(np.median(np.diff(freqs)))) * SPEED_OF_LIGHT / rest_freq
+    return np.arange(v_min, v_max + step / 2, step)
+
+
+def regrid_to_velocity(
+    freqs: np.ndarray,
+    powers: np.ndarray,
+    corrections: np.ndarray,
+    velocities: np.ndarray,
+    rest_freq: float = H1_LINE * 1e6,
+) -> np.ndarray:
+    """
+    Shift spectra to the LSR and resample them onto a common velocity axis.
+    Args:
+        freqs (np.ndarray): Frequencies in Hz, one axis for every spectrum
+            or one row per spectrum.
+        powers (np.ndarray): Spectra, one per row.
+        corrections (np.ndarray): LSR correction of each spectrum in km/s.
+        velocities (np.ndarray): Ascending velocity axis in km/s.
+        rest_freq (float): Rest frequency in Hz.
+    Returns:
+        np.ndarray: One row per spectrum on the velocity axis, NaN outside
+        each spectrum's band.
+    """
+    powers = np.atleast_2d(powers)
+    corrections = np.asarray(corrections, dtype=float).reshape(-1)
+    # Velocity falls as frequency rises, so reverse to get an ascending axis.
+    topocentric = radio_velocity(freqs, rest_freq)[..., ::-1]
+    powers = powers[:, ::-1]
+    if topocentric.ndim == 2:
+        out = np.empty((powers.shape[0], velocities.size))
+        for i, (v, p, correction) in enumerate(zip(topocentric, powers, corrections)):
+            out[i] = np.interp(velocities, v + correction, p, left=np.nan, right=np.nan)
+        return out
+
+    # One axis for every spectrum: look up all the shifted velocities at once.
+    # Spectra are evenly spaced in frequency, hence in radio velocity, so the
+    # position on the axis is arithmetic rather than a search.
+    wanted = velocities[None, :] - corrections[:, None]
+    step = np.diff(topocentric)
+    if np.allclose(step, step[0]):
+        position = (wanted - topocentric[0]) / step[0]
+    else:
+        upper = np.searchsorted(topocentric, wanted)
+        upper = np.clip(upper, 1, topocentric.size - 1)
+        lower = topocentric[upper - 1]
+        position = upper - 1 + (wanted - lower) / (topocentric[upper] - lower)
+    n_channels = topocentric.size
+    lower = np.clip(np.floor(position).astype(np.intp), 0, n_channels - 2)
+    fraction = position - lower
+    lower += np.arange(powers.shape[0])[:, None] * n_channels
+    flat = np.ascontiguousarray(powers).ravel()
+    below = flat[lower]
+    out = below + fraction * (flat[lower + 1] - below)
+    out[(position < 0) | (position > n_channels - 1)] = np.nan
+    return out
+
+
+def correct_observations(rows, velocities: np.ndarray | None = None, difference=True):
+    """
+    Load archived observations and put them on a common LSR velocity axis.
+    Args:
+        rows: Catalog rows from file_io.query_catalog, with utc, ra, dec,
+            date and observation. Rows without a pointing are skipped.
+        velocities (np.ndarray): Velocity axis in km/s; defaults to
+            velocity_axis of the first spectrum. Spectra that share a
+            frequency axis are regridded together.
+        difference (bool): Correct ON minus OFF; otherwise the ON spectra.
+    Returns:
+        velocities: float[] Velocity axis in km/s.
+        spectra: float[][] One row per observation used.
+        used: list The rows used, in the same order.
+    """
+    used = [r for r in rows if r["ra"] is not None and r["dec"] is not None]
+    if not used:
+        raise ValueError("None of the observations has a pointing.")
+    corrections = lsr_correction(
+        [r["utc"] for r in used], [r["ra"] for r in used], [r["dec"] for r in used]
+    )
+    observations = [load_observation(r["date"], r["observation"]) for r in used]
+    freqs = observations[0].freqs
+    if velocities is None:
+        velocities = velocity_axis(freqs)
+
+    def powers(observation):
+        return observation.difference if difference else observation.on
+
+    if all(np.array_equal(o.freqs, freqs) for o in observations):
+        spectra = np.array([powers(o) for o in observations])
+        spectra = regrid_to_velocity(freqs, spectra, corrections, velocities)
+        return velocities, spectra, used
+    spectra = np.empty((len(used), velocities.size))
+    for i, (observation, correction) in enumerate(zip(observations, corrections)):
+        spectra[i] = regrid_to_velocity(
+            observation.freqs, powers(observation), correction, velocities
+        )[0]
+    return velocities, spectra, used
@@ -0,0 +1,245 @@
+"""Spread spectrum integration over several processes.
+
+The capture thread writes IQ straight into a multiprocessing.shared_memory
+ring. Only slot indices travel over the queues, so no samples are ever
+pickled; each worker attaches to the ring, FFTs the slots it is handed into
+its own SpectrumEngine, and returns a bin_size accumulator at the end of the
+exposure for the parent to sum.
+"""
+
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable
+
+import numpy as np
+
+from .spectrum import SpectrumEngine
+
+_FLUSH = "flush"
+_PARTIAL = "partial"
+_ERROR = "error"
+_READY = "ready"
+
+
+def _worker_main(
+    shm_name: str,
+    shape: tuple,
+    tasks,
+    done,
+    bin_size: int,
+    sample_rate: float,
+    window: str,
+    dtype,
+):
+    """
+    Worker process loop: integrate the slots it is sent until told to stop.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    buffers = np.ndarray(shape, dtype=np.complex64, buffer=shm.buf)
+    try:
+        engine = SpectrumEngine(
+            bin_size, sample_rate, 0.0, shape[1], window=window, dtype=dtype
+        )
+        done.put(_READY)
+        while True:
+            message = tasks.get()
+            if message is None:
+                break
+            if message == _FLUSH:
+                done.put((_PARTIAL, *engine.partial()))
+                engine.reset()
+                continue
+            try:
+                engine.accumulate(buffers[message])
+            except Exception as e:
+                done.put((_ERROR, repr(e)))
+                continue
+            done.put(message)
+    finally:
+        # The ndarray must let go of shm.buf before the mapping can close.
+        del buffers
+        shm.close()
+
+
+class SpectralWorkerPool:
+    """A pool of spectrum processes fed from a shared-memory IQ ring."""
+
+    # How long to wait on the workers before assuming one of them has died.
+    TIMEOUT = 30.0
+
+    def __init__(
+        self,
+        n_workers: int,
+        sample_size: int,
+        bin_size: int,
+        sample_rate: float,
+        window: str = "boxcar",
+        dtype=np.complex64,
+        slots: int | None = None,
+    ):
+        """
+        Start the worker processes.
+        Args:
+            n_workers (int): Number of worker processes.
+            sample_size (int): Number of IQ samples per ring slot.
+            bin_size (int): Number of frequency bins.
+            sample_rate (float): Sample rate in Hz.
+            window (str): FFT window.
+            dtype: FFT working precision.
+            slots (int): Number of ring slots, by default four per worker.
+        """
+        if n_workers < 1:
+            raise ValueError("A worker pool needs at least one worker.")
+        self.n_workers = n_workers
+        self._slots = slots or 4 * n_workers
+        shape = (self._slots, sample_size)
+
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(shape)) * np.dtype(np.complex64).itemsize
+        )
+        self.buffers = np.ndarray(shape, dtype=np.complex64, buffer=self._shm.buf)
+        self._scratch = np.empty(sample_size, dtype=np.complex64)
+
+        # Spawn rather than fork: the parent already runs a capture thread and
+        # holds the USB device, and spawn is what Windows does anyway.
+        ctx = mp.get_context("spawn")
+        self._done = ctx.Queue()
+        self._tasks = [ctx.Queue() for _ in range(n_workers)]
+        self._processes = [
+            ctx.Process(
+                target=_worker_main,
+                args=(
+                    self._shm.name,
+                    shape,
+                    tasks,
+                    self._done,
+                    bin_size,
+                    sample_rate,
+                    window,
+                    dtype,
+                ),
+                name=f"spectrum-worker-{i}",
+                daemon=True,
+            )
+            for i, tasks in enumerate(self._tasks)
+        ]
+        try:
+            for process in self._processes:
+                process.start()
+            # Spawning re-imports numpy in every worker, which takes long enough
+            # to drop blocks if the first exposure started before they were up.
+            for _ in self._processes:
+                self._get_done()
+        except BaseException:
+            # The caller never gets the pool to close, so clean up here.
+            for process in self._processes:
+                if process.pid is not None:
+                    process.terminate()
+                    process.join()
+            del self.buffers
+            self._shm.close()
+            self._shm.unlink()
+            raise
+
+    def _get_done(self):
+        try:
+            message = self._done.get(timeout=self.TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError("Spectrum workers stopped responding.")
+        if isinstance(message, tuple) and message[0] == _ERROR:
+            raise RuntimeError(f"Spectrum worker failed: {message[1]}")
+        return message
+
+    def integrate(
+        self,
+        read_into: Callable[[np.ndarray], None],
+        n_blocks: int,
+        engine: SpectrumEngine,
+    ) -> int:
+        """
+        Capture n_blocks blocks and merge their spectra into engine.
+        Args:
+            read_into (callable): Fills the given buffer with fresh samples.
+            n_blocks (int): Number of blocks to integrate.
+            engine (SpectrumEngine): Receives the summed worker accumulators.
+        Returns:
+            int: Number of blocks dropped because every slot was busy.
+        """
+        free = queue.Queue()
+        for slot in range(self._slots):
+            free.put(slot)
+        state = {"submitted": 0, "dropped": 0, "error": None}
+        stop = threading.Event()
+
+        def reader():
+            try:
+                while state["submitted"] < n_blocks and not stop.is_set():
+                    try:
+                        slot = free.get_nowait()
+                    except queue.Empty:
+                        read_into(self._scratch)
+                        state["dropped"] += 1
+                        continue
+                    read_into(self.buffers[slot])
+                    self._tasks[state["submitted"] % self.n_workers].put(slot)
+                    state["submitted"] += 1
+            except Exception as e:
+                state["error"] = e
+
+        thread = threading.Thread(target=reader, name="iq-reader", daemon=True)
+        thread.start()
+        try:
+            processed = 0
+            last_done = time.monotonic()
+            while processed < n_blocks:
+                if state["error"] is not None:
+                    raise state["error"]
+                try:
+                    slot = self._done.get(timeout=0.5)
+                except queue.Empty:
+                    if not thread.is_alive() and state["error"] is None:
+                        if processed >= state["submitted"]:
+                            raise TimeoutError("IQ reader stopped early.")
+                    # A dead worker never hands its slots back, so the
+                    # reader would drop blocks into scratch forever.
+                    for process in self._processes:
+                        if not process.is_alive():
+                            raise RuntimeError(
+                                f"{process.name} died "
+                                f"(exit code {process.exitcode})."
+                            )
+                    if time.monotonic() - last_done > self.TIMEOUT:
+                        raise TimeoutError("Spectrum workers stopped responding.")
+                    continue
+                if isinstance(slot, tuple) and slot[0] == _ERROR:
+                    raise RuntimeError(f"Spectrum worker failed: {slot[1]}")
+                free.put(slot)
+                processed += 1
+                last_done = time.monotonic()
+        finally:
+            stop.set()
+            thread.join()
+
+        for tasks in self._tasks:
+            tasks.put(_FLUSH)
+        for _ in range(self.n_workers):
+            _, total, count = self._get_done()
+            engine.merge(total, count)
+        return state["dropped"]
+
+    def close(self):
+        """
+        Stop the workers and release the shared-memory ring.
+        """
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=self.TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        del self.buffers
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,133 @@
+"""Saving spectra from a background thread, off the observing loop."""
+
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .file_io import save_spectrum
+
+
+class AsyncSpectrumWriter:
+    """
+    Queues save_spectrum calls and runs them on a worker thread.
+
+    Writes are made durable in batches: after writing everything queued, the
+    worker fsyncs each file it touched once, at most every fsync_interval
+    seconds. flush() and close() are barriers that return only once every
+    spectrum queued before them is written and synced. A failed write is
+    raised to the caller from the next save, flush or close.
+    """
+
+    def __init__(self, max_pending: int = 8, fsync_interval: float = 1.0):
+        """
+        Args:
+            max_pending (int): Spectra that may wait to be written before
+                save() blocks.
+            fsync_interval (float): Longest time in seconds a written
+                spectrum waits to be synced while more are queued.
+        """
+        self.fsync_interval = fsync_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._errors = []
+        self._unsynced = set()
+        self._last_sync = time.monotonic()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="spectrum-writer", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Still write what was queued, without hiding the original error.
+            try:
+                self.close()
+            except RuntimeError as e:
+                print(f"Error saving spectra: {e}")
+
+    def save(self, freqs: np.ndarray, powers: np.ndarray, filename: str, **kwargs):
+        """
+        Queue a spectrum to be saved; takes the same arguments as
+        save_spectrum. The arrays are copied, so the caller may reuse them.
+        Blocks only while max_pending spectra are already waiting.
+        """
+        self._raise_errors()
+        if self._closed:
+            raise RuntimeError("AsyncSpectrumWriter is closed.")
+        kwargs = {
+            k: np.array(v) if isinstance(v, np.ndarray) else v
+            for k, v in kwargs.items()
+        }
+        self._queue.put((np.array(freqs), np.array(powers), filename, kwargs))
+
+    def flush(self):
+        """
+        Wait until every spectrum queued so far is written and synced to disk.
+        """
+        self._queue.join()
+        self._raise_errors()
+
+    def close(self):
+        """
+        Flush, then stop the worker thread.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_errors()
+
+    def _raise_errors(self):
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise RuntimeError(
+                f"{len(errors)} spectra failed to save, first: {errors[0]}"
+            ) from errors[0]
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            done = [item]
+            try:
+                # Write everything already queued before syncing once.
+                while item is not None:
+                    self._write(item)
+                    if time.monotonic() - self._last_sync >= self.fsync_interval:
+                        self._sync()
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    done.append(item)
+                self._sync()
+            finally:
+                for _ in done:
+                    self._queue.task_done()
+            if item is None:
+                return
+
+    def _write(self, item):
+        freqs, powers, filename, kwargs = item
+        try:
+            self._unsynced.add(save_spectrum(freqs, powers, filename, **kwargs))
+        except Exception as e:
+            self._errors.append(e)
+
+    def _sync(self):
+        for path in self._unsynced:
+            try:
+                with open(path, "ab") as f:
+                    os.fsync(f.fileno())
+            except OSError as e:
+                self._errors.append(e)
+        self._unsynced.clear()
+        self._last_sync = time.monotonic()